@@ -1,22 +1,22 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, abort
 from flask_login import login_user, logout_user, login_required, current_user
-from flask_socketio import join_room, leave_room, emit
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_socketio import join_room
 from datetime import datetime
-import os
 from dotenv import load_dotenv
+from config import Config, install_sqlite_pragmas
 from extensions import db, socketio, login_manager
+from socket_queue import message_queue_options
 
 load_dotenv()
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'swiftserve-secret-key-2024')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI', 'sqlite:///swiftserve.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config.from_object(Config())
 
 # Initialize extensions
 db.init_app(app)
-socketio.init_app(app, cors_allowed_origins="*")
+with app.app_context():
+    install_sqlite_pragmas(db.engine)
+socketio.init_app(app, cors_allowed_origins="*", **message_queue_options(app))
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
@@ -27,9 +27,69 @@ from models.menu_item import MenuItem
 from models.order import Order
 from models.order_item import OrderItem
 
+from batching import batch_planner
+import dashboard_queries
+import migrations
+from conditional import BOOT_ID, make_etag, is_fresh, not_modified, conditional_json
+from cart_store import cart_store, menu_item_lookup
+import order_service
+import order_state
+from dispatch import dispatcher
+from eta import eta_service, TRACKED_STATUSES as ETA_STATUSES
+from identity import identity_cache
+from location_pipeline import location_coalescer, order_assignments
+from location_trail import trail_store
+from menu_cache import menu_cache
+from metrics import metrics
+from order_events import order_delta, order_feed
+from passwords import password_hasher
+from profiling import profiler
+from restaurant_index import restaurant_locator
+import rollups
+from subscriptions import subscriptions
+from sweeper import order_sweeper
+from worker_bus import worker_bus
+
+password_hasher.init_app(app)
+identity_cache.init_app(app)
+cart_store.init_app(app)
+menu_cache.init_app(app)
+order_feed.init_app(app)
+dispatcher.init_app(app)
+location_coalescer.init_app(app)
+trail_store.init_app(app)
+eta_service.init_app(app)
+batch_planner.init_app(app)
+migrations.init_app(app)
+metrics.init_app(app)
+profiler.init_app(app)
+rollups.init_app(app)
+order_sweeper.init_app(app)
+subscriptions.init_app(app)
+worker_bus.init_app(app)
+location_coalescer.subscribe(lambda order_id, timestamp, latitude, longitude, agent_id:
+                             trail_store.record(order_id, timestamp, latitude, longitude))
+location_coalescer.subscribe(eta_service.observe)
+eta_service.locate_agent = dispatcher.nearest_available
+
+def refresh_restaurant(restaurant_id):
+    restaurant = db.session.get(Restaurant, restaurant_id)
+    if restaurant is None:
+        restaurant_locator.remove(restaurant_id)
+    else:
+        restaurant_locator.update(restaurant)
+
+# Cache invalidations run on every worker (see worker_bus.py)
+worker_bus.subscribe('restaurant', refresh_restaurant)
+worker_bus.subscribe('menu', menu_cache.invalidate)
+worker_bus.subscribe('menu_item', menu_item_lookup.invalidate)
+worker_bus.subscribe('identity', identity_cache.invalidate)
+worker_bus.subscribe('order_assignment', order_assignments.invalidate)
+worker_bus.subscribe('order_escalation', order_sweeper.acknowledge_escalation)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return identity_cache.load(int(user_id))
 
 # Routes
 @app.route('/')
@@ -42,10 +102,12 @@ def login():
         email = request.form['email']
         password = request.form['password']
         user = User.query.filter_by(email=email).first()
-        if user:
-            print(f'Stored password hash for {email}: {user.password}')  # Debugging line
         
-        if user and check_password_hash(user.password, password):
+        if user and password_hasher.verify(user.password, password):
+            # Upgrade hashes made with older cost parameters while we have the plaintext
+            if password_hasher.needs_rehash(user.password):
+                user.password = password_hasher.hash(password)
+                db.session.commit()
             login_user(user)
             if user.role == 'customer':
                 return redirect(url_for('customer_dashboard'))
@@ -63,8 +125,6 @@ def register():
     if request.method == 'POST':
         name = request.form['name']
         email = request.form['email']
-        password = generate_password_hash(request.form['password'])
-        print(f'Hashed password for {email}: {password}')  # Debugging line
         role = request.form['role']
         latitude = float(request.form.get('latitude', 0))
         longitude = float(request.form.get('longitude', 0))
@@ -74,6 +134,8 @@ def register():
             flash('Email already registered', 'error')
             return render_template('register.html')
         
+        password = password_hasher.hash(request.form['password'])
+        
         # Create new user
         new_user = User(
             name=name,
@@ -100,10 +162,11 @@ def register():
                 )
                 db.session.add(restaurant)
                 db.session.commit()
+                worker_bus.publish('restaurant', restaurant.id)
             
             flash('Registration successful! Please login.', 'success')
             return redirect(url_for('login'))
-        except Exception as e:
+        except Exception:
             db.session.rollback()
             flash('Registration failed. Please try again.', 'error')
     
@@ -122,8 +185,21 @@ def customer_dashboard():
     if current_user.role != 'customer':
         return redirect(url_for('index'))
     
-    restaurants = Restaurant.query.all()
-    return render_template('customer_dashboard.html', restaurants=restaurants)
+    latitude, longitude = customer_location()
+    nearby = restaurant_locator.nearby(
+        latitude,
+        longitude,
+        app.config['MAX_DELIVERY_RADIUS_KM'],
+        page=request.args.get('page', 1, type=int),
+        per_page=app.config['RESTAURANTS_PER_PAGE']
+    )
+    return render_template('customer_dashboard.html', restaurants=nearby.items, nearby=nearby)
+
+def customer_location():
+    latitude, longitude = current_user.latitude, current_user.longitude
+    if not latitude and not longitude:
+        latitude, longitude = app.config['MAP_DEFAULT_LAT'], app.config['MAP_DEFAULT_LNG']
+    return latitude, longitude
 
 @app.route('/customer/restaurant/<int:restaurant_id>')
 @login_required
@@ -131,9 +207,13 @@ def restaurant_menu(restaurant_id):
     if current_user.role != 'customer':
         return redirect(url_for('index'))
     
-    restaurant = Restaurant.query.get_or_404(restaurant_id)
-    menu_items = MenuItem.query.filter_by(restaurant_id=restaurant_id).all()
-    return render_template('restaurant_menu.html', restaurant=restaurant, menu_items=menu_items)
+    menu = menu_cache.get(restaurant_id)
+    if menu is None:
+        abort(404)
+    return render_template('restaurant_menu.html',
+                         restaurant=menu.restaurant,
+                         menu_items=menu.items,
+                         menu_html=menu.html)
 
 # Restaurant routes
 @app.route('/restaurant/dashboard')
@@ -143,13 +223,81 @@ def restaurant_dashboard():
         return redirect(url_for('index'))
     
     restaurant = Restaurant.query.filter_by(owner_id=current_user.id).first()
-    menu_items = MenuItem.query.filter_by(restaurant_id=restaurant.id).all() if restaurant else []
-    orders = Order.query.filter_by(restaurant_id=restaurant.id).all() if restaurant else []
+    if not restaurant:
+        flash('Restaurant profile not found.', 'error')
+        return redirect(url_for('index'))
+    
+    menu_items = MenuItem.query.filter_by(restaurant_id=restaurant.id).all()
+    history, next_cursor = dashboard_queries.order_history(restaurant.id, cursor=request.args.get('cursor'))
     
     return render_template('restaurant_dashboard.html', 
                          restaurant=restaurant, 
                          menu_items=menu_items, 
-                         orders=orders)
+                         stats=dashboard_queries.restaurant_stats(restaurant.id),
+                         active_orders=dashboard_queries.active_orders(restaurant.id),
+                         history=history,
+                         next_cursor=next_cursor,
+                         feed_seq=order_feed.current(f'restaurant_{restaurant.id}'))
+
+@app.route('/api/restaurant/orders/history')
+@login_required
+def restaurant_order_history():
+    if current_user.role != 'restaurant':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    restaurant = Restaurant.query.filter_by(owner_id=current_user.id).first()
+    if not restaurant:
+        return jsonify({'error': 'Restaurant not found'}), 404
+    
+    limit = max(1, min(request.args.get('limit', dashboard_queries.HISTORY_PAGE_SIZE, type=int), 100))
+    rows, next_cursor = dashboard_queries.order_history(restaurant.id, cursor=request.args.get('cursor'), limit=limit)
+    return jsonify({'orders': [row.to_dict() for row in rows], 'next_cursor': next_cursor})
+
+@app.route('/api/restaurant/rollups')
+@login_required
+def restaurant_rollups():
+    if current_user.role != 'restaurant':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    restaurant = Restaurant.query.filter_by(owner_id=current_user.id).first()
+    if not restaurant:
+        return jsonify({'error': 'Restaurant not found'}), 404
+    
+    period = request.args.get('period', 'day')
+    try:
+        start, end = rollups.parse_range(period, request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    
+    return jsonify({
+        'period': period,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'buckets': rollups.order_series(restaurant.id, period, start, end),
+        'top_items': rollups.top_items(restaurant.id, period, start, end, limit=limit)
+    })
+
+def feed_room():
+    if current_user.role == 'restaurant':
+        restaurant = Restaurant.query.filter_by(owner_id=current_user.id).first()
+        return f'restaurant_{restaurant.id}' if restaurant else None
+    if current_user.role == 'delivery_agent':
+        return f'agent_{current_user.id}'
+    return None
+
+@app.route('/api/feed/sync')
+@login_required
+def sync_order_feed():
+    room = feed_room()
+    if room is None:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    since = request.args.get('since', 0, type=int)
+    deltas = order_feed.since(room, since)
+    if deltas is None:
+        return jsonify({'seq': order_feed.current(room), 'reset': True})
+    return jsonify({'seq': order_feed.current(room), 'reset': False, 'deltas': deltas})
 
 # Restaurant profile edit
 @app.route('/restaurant/profile/edit', methods=['GET', 'POST'])
@@ -173,9 +321,11 @@ def edit_restaurant_profile():
         restaurant.cuisine_type = cuisine_type
         try:
             db.session.commit()
+            worker_bus.publish('restaurant', restaurant.id)
+            worker_bus.publish('menu', restaurant.id)
             flash('Restaurant profile updated successfully.', 'success')
             return redirect(url_for('restaurant_dashboard'))
-        except Exception as e:
+        except Exception:
             db.session.rollback()
             flash('Failed to update restaurant profile.', 'error')
 
@@ -188,19 +338,138 @@ def delivery_dashboard():
     if current_user.role != 'delivery_agent':
         return redirect(url_for('index'))
     
-    available_orders = Order.query.filter_by(status='ready_for_pickup').all()
+    if current_user.is_available:
+        dispatcher.set_agent_available(current_user.id, True, current_user.latitude, current_user.longitude)
+    
+    offered_ids = dispatcher.offers_for(current_user.id)
+    available_orders = Order.query.filter(
+        Order.id.in_(offered_ids),
+        Order.status == 'ready_for_pickup',
+        Order.agent_id.is_(None)
+    ).all() if offered_ids else []
     my_orders = Order.query.filter_by(agent_id=current_user.id).all()
     
     return render_template('delivery_dashboard.html', 
                          agent=current_user,
+                         orders=available_orders + my_orders,
                          available_orders=available_orders, 
-                         my_orders=my_orders)
+                         my_orders=my_orders,
+                         batches=batch_planner.proposals_for(current_user.id),
+                         feed_seq=order_feed.current(f'agent_{current_user.id}'))
 
 # Order tracking
 @app.route('/track/<int:order_id>')
 def track_order(order_id):
     order = Order.query.get_or_404(order_id)
-    return render_template('order_tracking.html', order=order)
+    return render_template('order_tracking.html', order=order, eta=eta_service.estimate(order.id))
+
+@app.route('/api/order/<int:order_id>/trail')
+@login_required
+def order_trail(order_id):
+    order = Order.query.get_or_404(order_id)
+    if current_user.id not in (order.customer_id, order.agent_id, order.restaurant.owner_id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    max_points = request.args.get('max_points', type=int)
+    samples = trail_store.trail(order.id, max_points=max_points if max_points and max_points > 0 else None)
+    return jsonify({
+        'order_id': order.id,
+        'trail': [{'timestamp': datetime.utcfromtimestamp(t).isoformat(), 'latitude': lat, 'longitude': lon}
+                  for t, lat, lon in samples]
+    })
+
+@app.route('/api/order/<int:order_id>/eta')
+@login_required
+def order_eta(order_id):
+    order = Order.query.get_or_404(order_id)
+    offered = current_user.role == 'delivery_agent' and order.id in dispatcher.offers_for(current_user.id)
+    if current_user.id not in (order.customer_id, order.agent_id, order.restaurant.owner_id) and not offered:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    agent_id = order.agent_id or (current_user.id if offered else None)
+    agent_position = dispatcher.agent_position(agent_id) if agent_id else None
+    route = eta_service.preview(order.id, agent_position)
+    if route is None:
+        return jsonify({'error': 'Order has no location data'}), 404
+    # Tracked orders use the live estimate built from pings and observed speed
+    route.update(eta_service.estimate(order.id) or {})
+    return jsonify(dict(route, order_id=order.id, status=order.status,
+                        agent={'latitude': agent_position[0], 'longitude': agent_position[1]} if agent_position else None))
+
+# Read-only JSON API with conditional responses
+@app.route('/api/restaurants/nearby')
+@login_required
+def api_nearby_restaurants():
+    latitude, longitude = customer_location()
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = app.config['RESTAURANTS_PER_PAGE']
+    
+    restaurant_locator.ensure_loaded()
+    etag = make_etag('nearby', BOOT_ID, restaurant_locator.version, latitude, longitude, page, per_page)
+    if is_fresh(etag):
+        return not_modified(etag)
+    
+    nearby = restaurant_locator.nearby(latitude, longitude, app.config['MAX_DELIVERY_RADIUS_KM'],
+                                       page=page, per_page=per_page)
+    return conditional_json({
+        'restaurants': [{
+            'id': r.id,
+            'name': r.name,
+            'address': r.address,
+            'cuisine_type': r.cuisine_type,
+            'distance_km': round(nearby.distances[r.id], 2)
+        } for r in nearby.items],
+        'page': nearby.page,
+        'pages': nearby.pages,
+        'total': nearby.total
+    }, etag)
+
+@app.route('/api/restaurants/<int:restaurant_id>/menu')
+@login_required
+def api_restaurant_menu(restaurant_id):
+    etag = make_etag('menu', BOOT_ID, restaurant_id, menu_cache.version(restaurant_id))
+    last_modified = menu_cache.last_modified(restaurant_id)
+    if is_fresh(etag, last_modified):
+        return not_modified(etag, last_modified)
+    
+    menu = menu_cache.get(restaurant_id)
+    if menu is None:
+        return jsonify({'error': 'Restaurant not found'}), 404
+    return conditional_json({'restaurant': menu.restaurant, 'items': menu.items},
+                            make_etag('menu', BOOT_ID, restaurant_id, menu.version), last_modified)
+
+@app.route('/api/order/<int:order_id>')
+@login_required
+def api_order(order_id):
+    # Version check: one narrow indexed lookup decides whether anything changed
+    version = db.session.query(Order.status, Order.agent_id, Order.customer_id, Restaurant.owner_id) \
+        .join(Restaurant, Restaurant.id == Order.restaurant_id) \
+        .filter(Order.id == order_id).first()
+    if version is None:
+        return jsonify({'error': 'Order not found'}), 404
+    status, agent_id, customer_id, owner_id = version
+    if current_user.id not in (customer_id, agent_id, owner_id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    etag = make_etag('order', order_id, status, agent_id)
+    if is_fresh(etag):
+        return not_modified(etag)
+    
+    order = Order.query.get_or_404(order_id)
+    items = db.session.query(OrderItem.menu_item_id, MenuItem.name, OrderItem.quantity, OrderItem.price_at_order) \
+        .join(MenuItem, MenuItem.id == OrderItem.menu_item_id) \
+        .filter(OrderItem.order_id == order_id).all()
+    return conditional_json({
+        'id': order.id,
+        'status': order.status,
+        'restaurant_id': order.restaurant_id,
+        'agent_id': order.agent_id,
+        'total_amount': order.total_amount,
+        'delivery_address': order.delivery_address,
+        'timestamp': order.timestamp.isoformat() if order.timestamp else None,
+        'items': [{'menu_item_id': item_id, 'name': name, 'quantity': quantity, 'price': price}
+                  for item_id, name, quantity, price in items]
+    }, etag)
 
 # API Routes
 @app.route('/api/cart/add', methods=['POST'])
@@ -209,21 +478,20 @@ def add_to_cart():
     if current_user.role != 'customer':
         return jsonify({'error': 'Unauthorized'}), 403
     
-    data = request.get_json()
-    item_id = data.get('item_id')
-    quantity = data.get('quantity', 1)
-    
-    # Store in session cart
-    if 'cart' not in session:
-        session['cart'] = {}
+    data = request.get_json(silent=True) or {}
+    try:
+        item_id = int(data.get('item_id'))
+        quantity = int(data.get('quantity', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid item'}), 400
+    if quantity < 1:
+        return jsonify({'error': 'Invalid quantity'}), 400
     
-    cart = session['cart']
-    if str(item_id) in cart:
-        cart[str(item_id)] += quantity
-    else:
-        cart[str(item_id)] = quantity
+    item = menu_item_lookup.get(item_id)
+    if item is None or not item.is_available:
+        return jsonify({'error': 'Item is not available'}), 400
     
-    session['cart'] = cart
+    cart = cart_store.add(current_user.id, item_id, quantity)
     return jsonify({'success': True, 'cart_count': sum(cart.values())})
 
 @app.route('/api/cart/remove', methods=['POST'])
@@ -232,14 +500,14 @@ def remove_from_cart():
     if current_user.role != 'customer':
         return jsonify({'error': 'Unauthorized'}), 403
     
-    data = request.get_json()
-    item_id = str(data.get('item_id'))
-    
-    if 'cart' in session and item_id in session['cart']:
-        del session['cart'][item_id]
-        session.modified = True
+    data = request.get_json(silent=True) or {}
+    try:
+        item_id = int(data.get('item_id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid item'}), 400
     
-    return jsonify({'success': True})
+    cart = cart_store.remove(current_user.id, item_id)
+    return jsonify({'success': True, 'cart_count': sum(cart.values())})
 
 @app.route('/api/order/place', methods=['POST'])
 @login_required
@@ -247,82 +515,133 @@ def place_order():
     if current_user.role != 'customer':
         return jsonify({'error': 'Unauthorized'}), 403
     
-    if 'cart' not in session or not session['cart']:
+    cart = cart_store.get(current_user.id)
+    if not cart:
         return jsonify({'error': 'Cart is empty'}), 400
     
-    data = request.get_json()
-    restaurant_id = data.get('restaurant_id')
+    data = request.get_json(silent=True) or {}
+    try:
+        restaurant_id = int(data.get('restaurant_id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid restaurant'}), 400
     
     try:
-        # Create order
-        order = Order(
-            customer_id=current_user.id,
-            restaurant_id=restaurant_id,
-            status='pending',
-            timestamp=datetime.utcnow()
+        order = order_service.create_order(
+            current_user.id,
+            restaurant_id,
+            cart,
+            delivery_address=data.get('delivery_address'),
+            special_instructions=data.get('special_instructions')
         )
-        db.session.add(order)
-        db.session.flush()
-        
-        # Add order items
-        for item_id, quantity in session['cart'].items():
-            order_item = OrderItem(
-                order_id=order.id,
-                menu_item_id=int(item_id),
-                quantity=quantity
-            )
-            db.session.add(order_item)
-        
-        db.session.commit()
-        
-        # Clear cart
-        session['cart'] = {}
-        
-        # Emit real-time update to restaurant
-        socketio.emit('new_order', {
-            'order_id': order.id,
-            'customer_name': current_user.name,
-            'items': len(session['cart'])
-        }, room=f'restaurant_{restaurant_id}')
-        
-        return jsonify({'success': True, 'order_id': order.id})
+    except order_service.OrderPlacementError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception:
+        return jsonify({'error': 'Order placement failed'}), 500
     
-    except Exception as e:
+    cart_store.clear(current_user.id)
+    
+    # Emit real-time update to restaurant
+    order_feed.publish('new_order', lambda: order_delta(order), [f'restaurant_{restaurant_id}'],
+                       customer_name=current_user.name, items=len(cart))
+    
+    return jsonify({'success': True, 'order_id': order.id, 'total_amount': order.total_amount})
+
+def apply_status_change(order_id, new_status):
+    try:
+        order = order_state.transition(order_id, new_status, current_user)
+    except order_state.TransitionError as e:
         db.session.rollback()
-        return jsonify({'error': 'Order placement failed'}), 500
+        return jsonify({'error': str(e)}), e.status_code
+    
+    publish_status_change(order, new_status)
+    return jsonify({'success': True})
+
+def publish_status_change(order, new_status):
+    # Dashboards patch themselves from the delta; offered agents learn the order is gone
+    rooms = {f'restaurant_{order.restaurant_id}'}
+    if order.agent_id:
+        rooms.add(f'agent_{order.agent_id}')
+    if new_status in ('picked_up', 'cancelled'):
+        rooms.update(f'agent_{agent_id}' for agent_id in dispatcher.withdraw(order.id))
+        batch_planner.discard_order(order.id)
+    order_feed.publish('order_status_updated', lambda: order_delta(order), sorted(rooms), status=new_status)
+    
+    if new_status == 'ready_for_pickup' and order.agent_id is None:
+        dispatcher.offer(order)
+    worker_bus.publish('order_assignment', order.id)
+    if new_status in order_state.TERMINAL_STATUSES:
+        location_coalescer.forget(order.id)
+        trail_store.discard(order.id)
+        eta_service.forget(order.id)
+    elif new_status in ETA_STATUSES:
+        eta_service.track(order.id)
+    
+    # Emit real-time update
+    if not subscriptions.has_subscribers(f'order_{order.id}'):
+        return
+    update = {
+        'order_id': order.id,
+        'status': new_status,
+        'timestamp': datetime.utcnow().isoformat()
+    }
+    update.update(eta_service.estimate(order.id) or {})
+    socketio.emit('order_status_update', update, room=f'order_{order.id}')
 
 @app.route('/api/order/update_status', methods=['POST'])
 @login_required
 def update_order_status():
     data = request.get_json()
-    order_id = data.get('order_id')
-    new_status = data.get('status')
-    
-    order = Order.query.get_or_404(order_id)
-    
-    # Check permissions
-    if current_user.role == 'restaurant' and order.restaurant.owner_id != current_user.id:
-        return jsonify({'error': 'Unauthorized'}), 403
-    elif current_user.role == 'delivery_agent' and order.agent_id != current_user.id and order.agent_id is None:
-        # Allow delivery agent to accept order
-        if new_status == 'picked_up':
-            order.agent_id = current_user.id
-        else:
-            return jsonify({'error': 'Unauthorized'}), 403
-    elif current_user.role == 'delivery_agent' and order.agent_id != current_user.id:
+    return apply_status_change(data.get('order_id'), data.get('status'))
+
+# Delivery agent API: claim, start and complete deliveries
+@app.route('/api/delivery/accept', methods=['POST'])
+@login_required
+def accept_delivery():
+    data = request.get_json()
+    return apply_status_change(data.get('order_id'), 'picked_up')
+
+@app.route('/api/delivery/start', methods=['POST'])
+@login_required
+def start_delivery():
+    data = request.get_json()
+    return apply_status_change(data.get('order_id'), 'in_transit')
+
+@app.route('/api/delivery/complete', methods=['POST'])
+@login_required
+def complete_delivery():
+    data = request.get_json()
+    return apply_status_change(data.get('order_id'), 'delivered')
+
+# Delivery agent API: accept a proposed multi-order run
+@app.route('/api/delivery/batch/accept', methods=['POST'])
+@login_required
+def accept_batch():
+    if current_user.role != 'delivery_agent':
         return jsonify({'error': 'Unauthorized'}), 403
     
-    order.status = new_status
-    db.session.commit()
+    data = request.get_json(silent=True) or {}
+    proposal = batch_planner.take(data.get('batch_id'), current_user.id)
+    if proposal is None:
+        return jsonify({'error': 'This batch is no longer available'}), 409
     
-    # Emit real-time update
-    socketio.emit('order_status_update', {
-        'order_id': order.id,
-        'status': new_status,
-        'timestamp': datetime.utcnow().isoformat()
-    }, room=f'order_{order.id}')
+    # Each order is claimed on its own; orders another agent took first are reported back
+    claimed, missed = [], []
+    for order_id in proposal['order_ids']:
+        try:
+            order = order_state.transition(order_id, 'picked_up', current_user)
+        except order_state.TransitionError:
+            db.session.rollback()
+            missed.append(order_id)
+            continue
+        publish_status_change(order, 'picked_up')
+        claimed.append(order_id)
     
-    return jsonify({'success': True})
+    return jsonify({
+        'success': bool(claimed),
+        'claimed': claimed,
+        'missed': missed,
+        'stops': [stop for stop in proposal['stops'] if stop['order_id'] in claimed]
+    })
 
 # Restaurant API: toggle open/closed status
 @app.route('/api/restaurant/toggle_status', methods=['POST'])
@@ -346,6 +665,8 @@ def toggle_restaurant_status():
             restaurant.is_active = not restaurant.is_active
 
         db.session.commit()
+        worker_bus.publish('restaurant', restaurant.id)
+        worker_bus.publish('menu', restaurant.id)
         return jsonify({'success': True, 'is_active': restaurant.is_active})
     except Exception:
         db.session.rollback()
@@ -358,18 +679,18 @@ def toggle_delivery_agent_status():
     if current_user.role != 'delivery_agent':
         return jsonify({'error': 'Unauthorized'}), 403
 
-    agent = User.query.get_or_404(current_user.id)
     data = request.get_json(silent=True) or {}
     is_available = data.get('is_available')
+    if is_available is None:
+        is_available = not current_user.is_available
+    is_available = bool(is_available)
 
     try:
-        if is_available is not None:
-            agent.is_available = is_available
-        else:
-            agent.is_available = not agent.is_available
-        
+        User.query.filter_by(id=current_user.id).update({'is_available': is_available}, synchronize_session=False)
         db.session.commit()
-        return jsonify({'success': True, 'is_available': agent.is_available})
+        worker_bus.publish('identity', current_user.id)
+        dispatcher.set_agent_available(current_user.id, is_available, current_user.latitude, current_user.longitude)
+        return jsonify({'success': True, 'is_available': is_available})
     except Exception:
         db.session.rollback()
         return jsonify({'error': 'Failed to update status'}), 500
@@ -413,6 +734,7 @@ def add_menu_item():
             )
             db.session.add(item)
             db.session.commit()
+            worker_bus.publish('menu', restaurant.id)
             flash('Menu item added successfully.', 'success')
             return redirect(url_for('restaurant_dashboard'))
         except Exception:
@@ -421,33 +743,116 @@ def add_menu_item():
 
     return render_template('restaurant_add_menu_item.html', restaurant=restaurant)
 
+# Restaurant API: toggle menu item availability
+@app.route('/api/menu/item/<int:item_id>/toggle_availability', methods=['POST'])
+@login_required
+def toggle_menu_item_availability(item_id):
+    if current_user.role != 'restaurant':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    restaurant = Restaurant.query.filter_by(owner_id=current_user.id).first()
+    item = MenuItem.query.get_or_404(item_id)
+    if not restaurant or item.restaurant_id != restaurant.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    try:
+        item.is_available = not item.is_available
+        db.session.commit()
+        worker_bus.publish('menu', item.restaurant_id)
+        worker_bus.publish('menu_item', item.id)
+        return jsonify({'success': True, 'is_available': item.is_available})
+    except Exception:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to update item'}), 500
+
 # SocketIO events
+def requested_id(data, key):
+    try:
+        return int((data or {}).get(key))
+    except (TypeError, ValueError):
+        return None
+
+def subscribe(room):
+    join_room(room)
+    subscriptions.join(request.sid, room)
+
 @socketio.on('join_order_room')
 def handle_join_order_room(data):
-    order_id = data.get('order_id')
-    join_room(f'order_{order_id}')
+    order_id = requested_id(data, 'order_id')
+    if not current_user.is_authenticated or order_id is None:
+        return {'error': 'Unauthorized'}
+    
+    # Customer, assigned agent and the restaurant's owner may watch an order
+    parties = db.session.query(Order.customer_id, Order.agent_id, Restaurant.owner_id) \
+        .join(Restaurant, Restaurant.id == Order.restaurant_id) \
+        .filter(Order.id == order_id).first()
+    if parties is None or current_user.id not in parties:
+        return {'error': 'Unauthorized'}
+    subscribe(f'order_{order_id}')
 
 @socketio.on('join_restaurant_room')
 def handle_join_restaurant_room(data):
-    restaurant_id = data.get('restaurant_id')
-    join_room(f'restaurant_{restaurant_id}')
+    restaurant_id = requested_id(data, 'restaurant_id')
+    if not current_user.is_authenticated or current_user.role != 'restaurant' or restaurant_id is None:
+        return {'error': 'Unauthorized'}
+    
+    owned = db.session.query(Restaurant.id) \
+        .filter(Restaurant.id == restaurant_id, Restaurant.owner_id == current_user.id).first()
+    if owned is None:
+        return {'error': 'Unauthorized'}
+    subscribe(f'restaurant_{restaurant_id}')
+
+@socketio.on('acknowledge_escalation')
+def handle_acknowledge_escalation(data):
+    # The sweeper re-sends order_escalated until the restaurant's dashboard confirms it was shown
+    order_id = requested_id(data, 'order_id')
+    if not current_user.is_authenticated or current_user.role != 'restaurant' or order_id is None:
+        return
+    owned = db.session.query(Order.id).join(Restaurant, Restaurant.id == Order.restaurant_id) \
+        .filter(Order.id == order_id, Restaurant.owner_id == current_user.id).first()
+    if owned is not None:
+        # The sweeper may be running on another worker
+        worker_bus.publish('order_escalation', order_id)
+
+@socketio.on('join_delivery_room')
+def handle_join_delivery_room(data):
+    if current_user.is_authenticated and current_user.role == 'delivery_agent':
+        subscribe(f'agent_{current_user.id}')
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    subscriptions.disconnect(request.sid)
 
 @socketio.on('location_update')
 def handle_location_update(data):
-    order_id = data.get('order_id')
-    latitude = data.get('latitude')
-    longitude = data.get('longitude')
-    
-    # Emit to order tracking room
-    emit('delivery_location_update', {
-        'order_id': order_id,
-        'latitude': latitude,
-        'longitude': longitude,
-        'timestamp': datetime.utcnow().isoformat()
-    }, room=f'order_{order_id}')
+    # Only the agent delivering an order may report its position
+    if not current_user.is_authenticated or current_user.role != 'delivery_agent':
+        return
+    order_id = requested_id(data, 'order_id')
+    if order_id is None or not order_assignments.may_report(order_id, current_user.id):
+        return
+    
+    # Queue for the next batched delivery_location_update flush
+    if not location_coalescer.submit(order_id, data.get('latitude'), data.get('longitude'),
+                                     timestamp=data.get('timestamp'), agent_id=current_user.id):
+        return
+    
+    dispatcher.update_agent_location(current_user.id, float(data['latitude']), float(data['longitude']))
+
+metrics.instrument_socketio(socketio)
+
+def start_background_tasks():
+    socketio.start_background_task(dispatcher.run, app)
+    socketio.start_background_task(location_coalescer.run, app)
+    socketio.start_background_task(trail_store.run, app)
+    socketio.start_background_task(eta_service.run, app)
+    socketio.start_background_task(batch_planner.run, app, dispatcher)
+    socketio.start_background_task(order_sweeper.run, app, publish_status_change)
+    socketio.start_background_task(worker_bus.run, app)
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        migrations.upgrade()
     
+    start_background_tasks()
     socketio.run(app, debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
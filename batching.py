@@ -0,0 +1,228 @@
+import threading
+import time
+
+from extensions import db, socketio
+from geo import GridIndex, haversine_km
+from models.user import User
+from models.restaurant import Restaurant
+from models.order import Order
+from subscriptions import subscriptions
+
+
+class ReadyOrder:
+    """A ready, unclaimed order with its pickup and drop-off points"""
+
+    __slots__ = ('id', 'placed_at', 'total_amount', 'delivery_address', 'restaurant_id', 'restaurant_name',
+                 'pickup', 'dropoff')
+
+    def __init__(self, id, placed_at, total_amount, delivery_address, restaurant_id, restaurant_name,
+                 pickup, dropoff):
+        self.id = id
+        self.placed_at = placed_at
+        self.total_amount = total_amount
+        self.delivery_address = delivery_address
+        self.restaurant_id = restaurant_id
+        self.restaurant_name = restaurant_name
+        self.pickup = pickup
+        self.dropoff = dropoff
+
+
+def _nearest_first(start, stops):
+    """Order (point, payload) stops greedily by nearest neighbour from start"""
+    remaining = list(stops)
+    ordered = []
+    here = start
+    while remaining:
+        nearest = min(remaining, key=lambda stop: haversine_km(here[0], here[1], stop[0][0], stop[0][1]))
+        remaining.remove(nearest)
+        ordered.append(nearest)
+        here = nearest[0]
+    return ordered
+
+
+def _path_km(points):
+    return sum(haversine_km(a[0], a[1], b[0], b[1]) for a, b in zip(points, points[1:]))
+
+
+class BatchPlanner:
+    """Groups ready orders into multi-pickup runs and proposes each run to one agent.
+
+    Every BATCH_INTERVAL_SECONDS the ready, unclaimed orders are clustered
+    greedily: oldest order first, joined by others whose restaurant is
+    within BATCH_PICKUP_RADIUS_KM, whose customer is within
+    BATCH_DROPOFF_RADIUS_KM and which were placed within
+    BATCH_WINDOW_MINUTES of it. A run is only proposed if it is shorter than
+    delivering its orders one by one. Individual dispatch offers stay open;
+    accepting a run claims each of its orders that is still unclaimed.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.pickup_radius_km = 1.0
+        self.dropoff_radius_km = 2.0
+        self.window_seconds = 600
+        self.max_orders = 3
+        self.interval = 15
+        self.proposal_ttl = 90
+        self._proposals = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('BATCH_ENABLED', self.enabled))
+        self.pickup_radius_km = float(app.config.get('BATCH_PICKUP_RADIUS_KM', self.pickup_radius_km))
+        self.dropoff_radius_km = float(app.config.get('BATCH_DROPOFF_RADIUS_KM', self.dropoff_radius_km))
+        self.window_seconds = int(app.config.get('BATCH_WINDOW_MINUTES', self.window_seconds // 60)) * 60
+        self.max_orders = int(app.config.get('BATCH_MAX_ORDERS', self.max_orders))
+        self.interval = int(app.config.get('BATCH_INTERVAL_SECONDS', self.interval))
+        self.proposal_ttl = int(app.config.get('DISPATCH_OFFER_TTL_SECONDS', self.proposal_ttl))
+        app.extensions['batch_planner'] = self
+
+    # Planning
+
+    def ready_orders(self):
+        rows = db.session.query(Order.id, Order.timestamp, Order.total_amount, Order.delivery_address,
+                                Restaurant.id, Restaurant.name, Restaurant.latitude, Restaurant.longitude,
+                                User.latitude, User.longitude) \
+            .join(Restaurant, Restaurant.id == Order.restaurant_id) \
+            .join(User, User.id == Order.customer_id) \
+            .filter(Order.status == 'ready_for_pickup', Order.agent_id.is_(None)).all()
+        return [ReadyOrder(order_id, placed_at, total, address, restaurant_id, name, (r_lat, r_lon), (c_lat, c_lon))
+                for order_id, placed_at, total, address, restaurant_id, name, r_lat, r_lon, c_lat, c_lon in rows
+                if None not in (placed_at, r_lat, r_lon, c_lat, c_lon)]
+
+    def cluster(self, orders):
+        """Greedy grouping of ReadyOrders into lists of 2..max_orders"""
+        pickups = GridIndex(cell_size_km=max(self.pickup_radius_km, 0.1))
+        by_id = {}
+        for order in orders:
+            pickups.upsert(order.id, order.pickup[0], order.pickup[1])
+            by_id[order.id] = order
+
+        groups = []
+        for seed in sorted(orders, key=lambda o: (o.placed_at, o.id)):
+            if seed.id not in pickups:
+                continue
+            group = [seed]
+            for distance, order_id in pickups.within(seed.pickup[0], seed.pickup[1], self.pickup_radius_km):
+                if len(group) >= self.max_orders:
+                    break
+                other = by_id[order_id]
+                if other is seed:
+                    continue
+                if abs((other.placed_at - seed.placed_at).total_seconds()) > self.window_seconds:
+                    continue
+                if haversine_km(seed.dropoff[0], seed.dropoff[1], other.dropoff[0], other.dropoff[1]) \
+                        > self.dropoff_radius_km:
+                    continue
+                group.append(other)
+            if len(group) < 2:
+                continue
+            for order in group:
+                pickups.remove(order.id)
+            groups.append(group)
+        return groups
+
+    def route(self, group):
+        """Stops for a group (all pickups, then all drop-offs) with run and one-by-one distances"""
+        start = group[0].pickup
+        pickups = _nearest_first(start, [(o.pickup, o) for o in group])
+        dropoffs = _nearest_first(pickups[-1][0], [(o.dropoff, o) for o in group])
+        stops = [{'type': 'pickup', 'order_id': o.id, 'name': o.restaurant_name,
+                  'latitude': point[0], 'longitude': point[1]} for point, o in pickups]
+        stops += [{'type': 'dropoff', 'order_id': o.id, 'name': o.delivery_address,
+                   'latitude': point[0], 'longitude': point[1]} for point, o in dropoffs]
+        run_km = _path_km([point for point, _ in pickups] + [point for point, _ in dropoffs])
+        # Separately: each order's own trip plus riding back from its customer to the next restaurant
+        single_km = sum(haversine_km(o.pickup[0], o.pickup[1], o.dropoff[0], o.dropoff[1]) for o in group) + \
+            sum(haversine_km(a.dropoff[0], a.dropoff[1], b.pickup[0], b.pickup[1]) for a, b in zip(group, group[1:]))
+        return stops, run_km, single_km
+
+    def plan_and_propose(self, dispatcher):
+        """Cluster ready orders not already in a live proposal and offer each run to its best agent"""
+        now = time.time()
+        with self._lock:
+            self._proposals = dict((batch_id, p) for batch_id, p in self._proposals.items() if p['expires'] > now)
+            proposed_orders = set(order_id for p in self._proposals.values() for order_id in p['order_ids'])
+            busy_agents = set(p['agent_id'] for p in self._proposals.values())
+
+        orders = [o for o in self.ready_orders() if o.id not in proposed_orders]
+        proposals = []
+        for group in self.cluster(orders):
+            stops, run_km, single_km = self.route(group)
+            if run_km >= single_km:
+                continue
+            start = stops[0]
+            candidates = dispatcher.candidates(start['latitude'], start['longitude'], exclude=busy_agents)
+            if not candidates:
+                continue
+            _, agent_id, distance = candidates[0]
+            busy_agents.add(agent_id)
+            order_ids = sorted(o.id for o in group)
+            proposal = {
+                'batch_id': 'batch-' + '-'.join(str(order_id) for order_id in order_ids),
+                'agent_id': agent_id,
+                'order_ids': order_ids,
+                'orders': [{'id': o.id, 'restaurant_name': o.restaurant_name, 'delivery_address': o.delivery_address,
+                            'total_amount': o.total_amount} for o in group],
+                'stops': stops,
+                'distance_km': round(run_km + distance, 2),
+                'saved_km': round(single_km - run_km, 2),
+                'expires': now + self.proposal_ttl
+            }
+            with self._lock:
+                self._proposals[proposal['batch_id']] = proposal
+            if subscriptions.has_subscribers(f'agent_{agent_id}'):
+                socketio.emit('new_batch_offer', self.public(proposal), room=f'agent_{agent_id}')
+            proposals.append(proposal)
+        return proposals
+
+    # Proposals
+
+    @staticmethod
+    def public(proposal):
+        return dict((key, value) for key, value in proposal.items() if key != 'expires')
+
+    def proposals_for(self, agent_id):
+        now = time.time()
+        with self._lock:
+            return [self.public(p) for p in self._proposals.values() if p['agent_id'] == agent_id and p['expires'] > now]
+
+    def take(self, batch_id, agent_id):
+        """Remove and return an agent's live proposal, or None if it expired or is not theirs"""
+        with self._lock:
+            proposal = self._proposals.get(batch_id)
+            if proposal is None or proposal['agent_id'] != agent_id or proposal['expires'] <= time.time():
+                return None
+            del self._proposals[batch_id]
+        return proposal
+
+    def discard_order(self, order_id):
+        """Drop proposals containing an order that was claimed or cancelled elsewhere"""
+        with self._lock:
+            stale = [self._proposals.pop(batch_id) for batch_id, p in list(self._proposals.items())
+                     if order_id in p['order_ids']]
+        for proposal in stale:
+            if not subscriptions.has_subscribers(f"agent_{proposal['agent_id']}"):
+                continue
+            socketio.emit('batch_offer_withdrawn', {'batch_id': proposal['batch_id']},
+                          room=f"agent_{proposal['agent_id']}")
+
+    def run(self, app, dispatcher):
+        """Background planning loop; start with socketio.start_background_task"""
+        while True:
+            socketio.sleep(self.interval)
+            if not self.enabled:
+                continue
+            with app.app_context():
+                try:
+                    self.plan_and_propose(dispatcher)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Batch planning failed')
+                finally:
+                    db.session.remove()
+
+
+batch_planner = BatchPlanner()
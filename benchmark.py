@@ -0,0 +1,335 @@
+"""Benchmark the hot HTTP routes and socket handlers in-process.
+
+    python generate_data.py --users 20000 --restaurants 2000 --orders 200000
+    python benchmark.py --requests 500 --concurrency 8
+    python benchmark.py --compare bench_results/<earlier run>.json
+
+Drives the app through Flask's and Flask-SocketIO's test clients against
+the configured database, so numbers include routing, templates, the ORM and
+the database but not the network or the WSGI server. Users come from a
+generate_data.py run (--tag/--password must match it). Every run is saved
+as JSON under --output, named by time and git commit, for comparison.
+
+Background loops are not started, so location_update measures the handler
+and coalescer submit path only.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import func
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db, socketio
+from models.user import User
+from models.restaurant import Restaurant
+from models.menu_item import MenuItem
+from models.order import Order
+
+SCENARIOS = ['login', 'restaurant_menu', 'add_to_cart', 'place_order', 'update_order_status', 'location_update']
+
+
+class Recorder:
+    """Thread-safe collection of per-call latencies for one scenario"""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.errors = 0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def time(self, call):
+        start = time.perf_counter()
+        try:
+            ok = call()
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies.append(elapsed)
+            if not ok:
+                self.errors += 1
+        return ok
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        wall = (self.finished or time.perf_counter()) - (self.started or 0)
+        if not latencies:
+            return {'count': 0, 'errors': self.errors}
+        return {
+            'count': len(latencies),
+            'errors': self.errors,
+            'throughput_rps': round(len(latencies) / wall, 1) if wall > 0 else None,
+            'mean_ms': round(1000 * sum(latencies) / len(latencies), 3),
+            'p50_ms': round(1000 * percentile(latencies, 50), 3),
+            'p95_ms': round(1000 * percentile(latencies, 95), 3),
+            'p99_ms': round(1000 * percentile(latencies, 99), 3),
+            'max_ms': round(1000 * latencies[-1], 3)
+        }
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def run_workers(recorder, concurrency, jobs, worker):
+    """Split jobs across `concurrency` threads, each calling worker(index, jobs_slice, recorder)"""
+    slices = [jobs[i::concurrency] for i in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(i, part, recorder), daemon=True)
+               for i, part in enumerate(slices) if part]
+    recorder.started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder.finished = time.perf_counter()
+    return recorder
+
+
+def logged_in_client(email, password):
+    client = app.test_client()
+    response = client.post('/login', data={'email': email, 'password': password})
+    if response.status_code != 302:
+        raise SystemExit(f'Could not log in as {email}; does --tag/--password match generate_data.py?')
+    return client
+
+
+class Fixtures:
+    """Users, restaurants and menu items drawn from a generated dataset"""
+
+    def __init__(self, args):
+        rng = random.Random(args.seed)
+        pattern = f'{args.tag}-%@example.com'
+        pool = args.concurrency * 4
+
+        def emails(role, limit):
+            return [row.email for row in db.session.query(User.email)
+                    .filter(User.role == role, User.email.like(pattern)).order_by(User.id).limit(limit)]
+
+        self.customers = emails('customer', pool)
+        # Agents with an order out for delivery; only the assigned agent may report its position
+        agent_orders = db.session.query(User.id, User.email, func.min(Order.id)) \
+            .join(Order, Order.agent_id == User.id) \
+            .filter(User.role == 'delivery_agent', User.email.like(pattern),
+                    Order.status.in_(('in_transit', 'picked_up'))) \
+            .group_by(User.id, User.email).order_by(User.id).limit(args.location_clients).all()
+        self.agents = [(agent_id, email) for agent_id, email, _ in agent_orders]
+        self.agent_order = dict((agent_id, order_id) for agent_id, _, order_id in agent_orders)
+        restaurants = db.session.query(Restaurant.id, Restaurant.owner_id) \
+            .join(User, User.id == Restaurant.owner_id) \
+            .filter(Restaurant.is_active.is_(True), User.email.like(pattern)) \
+            .order_by(Restaurant.id).limit(pool).all()
+        if not self.customers or not restaurants:
+            raise SystemExit(f"No generated data for tag '{args.tag}'; run generate_data.py first")
+
+        items = db.session.query(MenuItem.restaurant_id, MenuItem.id) \
+            .filter(MenuItem.restaurant_id.in_([r.id for r in restaurants]), MenuItem.is_available.is_(True)).all()
+        self.menu = {}
+        for restaurant_id, item_id in items:
+            self.menu.setdefault(restaurant_id, []).append(item_id)
+        self.restaurants = [r for r in restaurants if r.id in self.menu]
+        owner_ids = set(r.owner_id for r in self.restaurants)
+        self.owner_email = dict(db.session.query(User.id, User.email).filter(User.id.in_(owner_ids)).all())
+        self.rng = rng
+        self.database = db.engine.dialect.name
+
+
+def scenario_login(args, fx):
+    def worker(index, jobs, recorder):
+        client = app.test_client()
+        for email in jobs:
+            recorder.time(lambda: client.post('/login', data={'email': email, 'password': args.password})
+                          .status_code == 302)
+    jobs = [fx.customers[i % len(fx.customers)] for i in range(args.requests)]
+    return run_workers(Recorder('login'), args.concurrency, jobs, worker)
+
+
+def scenario_restaurant_menu(args, fx):
+    def worker(index, jobs, recorder):
+        client = logged_in_client(fx.customers[index % len(fx.customers)], args.password)
+        for restaurant_id in jobs:
+            recorder.time(lambda: client.get(f'/customer/restaurant/{restaurant_id}').status_code == 200)
+    jobs = [fx.rng.choice(fx.restaurants).id for _ in range(args.requests)]
+    return run_workers(Recorder('restaurant_menu'), args.concurrency, jobs, worker)
+
+
+def scenario_add_to_cart(args, fx):
+    def worker(index, jobs, recorder):
+        client = logged_in_client(fx.customers[index % len(fx.customers)], args.password)
+        for item_id in jobs:
+            recorder.time(lambda: client.post('/api/cart/add', json={'item_id': item_id, 'quantity': 1})
+                          .status_code == 200)
+        # Leave the cart empty for place_order, which reuses these customers
+        for item_id in set(jobs):
+            client.post('/api/cart/remove', json={'item_id': item_id})
+    # All items from one restaurant so carts stay single-restaurant
+    restaurant = fx.rng.choice(fx.restaurants)
+    jobs = [fx.rng.choice(fx.menu[restaurant.id]) for _ in range(args.requests)]
+    return run_workers(Recorder('add_to_cart'), args.concurrency, jobs, worker)
+
+
+def scenario_place_order(args, fx):
+    placed = []
+    lock = threading.Lock()
+
+    def worker(index, jobs, recorder):
+        client = logged_in_client(fx.customers[index % len(fx.customers)], args.password)
+        for restaurant, item_ids in jobs:
+            for item_id in item_ids:
+                client.post('/api/cart/add', json={'item_id': item_id, 'quantity': 1})
+
+            def place():
+                response = client.post('/api/order/place', json={
+                    'restaurant_id': restaurant.id, 'delivery_address': 'Benchmark Street'})
+                if response.status_code != 200:
+                    return False
+                with lock:
+                    placed.append((response.get_json()['order_id'], restaurant.owner_id))
+                return True
+            recorder.time(place)
+    jobs = []
+    for _ in range(args.requests):
+        restaurant = fx.rng.choice(fx.restaurants)
+        jobs.append((restaurant, fx.rng.sample(fx.menu[restaurant.id], min(2, len(fx.menu[restaurant.id])))))
+    recorder = run_workers(Recorder('place_order'), args.concurrency, jobs, worker)
+    fx.placed = placed
+    return recorder
+
+
+def scenario_update_order_status(args, fx):
+    by_owner = {}
+    for order_id, owner_id in getattr(fx, 'placed', []):
+        by_owner.setdefault(owner_id, []).append(order_id)
+    if not by_owner:
+        print('update_order_status: skipped, needs orders from place_order in the same run')
+        return Recorder('update_order_status')
+
+    def worker(index, jobs, recorder):
+        for owner_id, order_ids in jobs:
+            client = logged_in_client(fx.owner_email[owner_id], args.password)
+            for order_id in order_ids:
+                recorder.time(lambda: client.post('/api/order/update_status', json={
+                    'order_id': order_id, 'status': 'accepted'}).status_code == 200)
+    return run_workers(Recorder('update_order_status'), args.concurrency, list(by_owner.items()), worker)
+
+
+def scenario_location_update(args, fx):
+    if not fx.agents:
+        print('location_update: skipped, needs delivery agents with in-progress orders')
+        return Recorder('location_update')
+
+    def worker(index, jobs, recorder):
+        for agent_id, email in jobs:
+            http = logged_in_client(email, args.password)
+            client = socketio.test_client(app, flask_test_client=http)
+            order_id = fx.agent_order[agent_id]
+            lat, lon = 12.9716, 77.5946
+
+            def send():
+                client.emit('location_update', {'order_id': order_id, 'latitude': lat,
+                                                'longitude': lon, 'timestamp': time.time()})
+                return True
+            for step in range(args.location_updates):
+                lat += 0.0001
+                lon += 0.0001
+                recorder.time(send)
+            client.disconnect()
+    # One streaming socket per agent, all running at once
+    return run_workers(Recorder('location_update'), len(fx.agents), list(fx.agents), worker)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_report(results, baseline=None):
+    header = f"{'scenario':<22}{'count':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for name, stats in results.items():
+        if not stats.get('count'):
+            continue
+        print(f"{name:<22}{stats['count']:>8}{stats['errors']:>6}{stats['throughput_rps']:>10}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+        previous = (baseline or {}).get(name)
+        if previous and previous.get('count'):
+            deltas = []
+            for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+                if previous.get(key):
+                    deltas.append(f'{(stats[key] - previous[key]) / previous[key] * 100:+.1f}%')
+                else:
+                    deltas.append('n/a')
+            print(f"{'  vs baseline':<36}{deltas[0]:>10}{deltas[1]:>10}{deltas[2]:>10}{deltas[3]:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark SwiftServe routes and socket handlers')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--requests', type=int, default=500, help='calls per HTTP scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads per HTTP scenario')
+    parser.add_argument('--location-clients', type=int, default=20, help='concurrent agent sockets')
+    parser.add_argument('--location-updates', type=int, default=200, help='updates sent per agent socket')
+    parser.add_argument('--tag', default='load', help='generate_data.py tag to draw users from')
+    parser.add_argument('--password', default='password123')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', default='bench_results', help='directory results are saved to')
+    parser.add_argument('--compare', help='earlier results file to report deltas against')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    selected = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    app.config['TESTING'] = True
+    with app.app_context():
+        fx = Fixtures(args)
+        db.session.remove()
+
+    results = {}
+    for name in SCENARIOS:
+        if name in selected:
+            results[name] = globals()[f'scenario_{name}'](args, fx).summary()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)['results']
+    print_report(results, baseline)
+
+    commit = git_commit()
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}-{commit}.json")
+    with open(path, 'w') as handle:
+        json.dump({
+            'commit': commit,
+            'recorded_at': datetime.utcnow().isoformat(),
+            'database': fx.database,
+            'args': vars(args),
+            'results': results
+        }, handle, indent=2)
+    print(f'\nSaved {path}')
+
+
+if __name__ == '__main__':
+    main()
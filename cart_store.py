@@ -0,0 +1,172 @@
+import threading
+
+from sqlalchemy import case, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from caching import TTLCache
+from models.menu_item import MenuItem
+from models.cart_item import CartItem
+
+MAX_ITEM_QUANTITY = 50
+
+
+class MenuItemInfo:
+    """Just the MenuItem fields the cart needs"""
+
+    __slots__ = ('id', 'restaurant_id', 'name', 'price', 'is_available')
+
+    def __init__(self, id, restaurant_id, name, price, is_available):
+        self.id = id
+        self.restaurant_id = restaurant_id
+        self.name = name
+        self.price = price
+        self.is_available = is_available
+
+
+class MenuItemLookup:
+    """Cached id -> MenuItemInfo resolution, one query per batch of misses"""
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self._cache = TTLCache(max_entries, ttl)
+
+    def configure(self, max_entries, ttl):
+        self._cache = TTLCache(max_entries, ttl)
+
+    def get_many(self, item_ids):
+        found = {}
+        missing = []
+        for item_id in item_ids:
+            info = self._cache.get(item_id)
+            if info is None:
+                missing.append(item_id)
+            else:
+                found[item_id] = info
+        if missing:
+            rows = db.session.query(MenuItem.id, MenuItem.restaurant_id, MenuItem.name,
+                                    MenuItem.price, MenuItem.is_available) \
+                .filter(MenuItem.id.in_(missing)).all()
+            for row in rows:
+                info = MenuItemInfo(*row)
+                self._cache.set(info.id, info)
+                found[info.id] = info
+        return found
+
+    def get(self, item_id):
+        return self.get_many([item_id]).get(item_id)
+
+    def invalidate(self, item_id):
+        self._cache.pop(item_id)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class MemoryCartStore:
+    """Carts held in this process; suitable for a single node"""
+
+    def __init__(self, max_entries=10000, ttl=24 * 3600):
+        self._carts = TTLCache(max_entries, ttl)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        return dict(self._carts.get(user_id) or {})
+
+    def add(self, user_id, item_id, quantity):
+        with self._lock:
+            cart = dict(self._carts.get(user_id) or {})
+            cart[item_id] = min(cart.get(item_id, 0) + quantity, MAX_ITEM_QUANTITY)
+            self._carts.set(user_id, cart)
+        return dict(cart)
+
+    def remove(self, user_id, item_id):
+        with self._lock:
+            cart = dict(self._carts.get(user_id) or {})
+            cart.pop(item_id, None)
+            self._carts.set(user_id, cart)
+        return dict(cart)
+
+    def clear(self, user_id):
+        self._carts.pop(user_id)
+
+
+class SqlCartStore:
+    """Carts in the cart_item table, shared by every worker"""
+
+    def get(self, user_id):
+        rows = db.session.query(CartItem.menu_item_id, CartItem.quantity) \
+            .filter(CartItem.user_id == user_id).all()
+        return dict(rows)
+
+    def add(self, user_id, item_id, quantity):
+        # Increment in SQL; if a concurrent add inserts the row first, the retry updates it
+        total = CartItem.quantity + quantity
+        for _ in range(2):
+            updated = db.session.execute(
+                update(CartItem)
+                .where(CartItem.user_id == user_id, CartItem.menu_item_id == item_id)
+                .values(quantity=case((total > MAX_ITEM_QUANTITY, MAX_ITEM_QUANTITY), else_=total))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if updated:
+                break
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(CartItem).values(
+                        user_id=user_id, menu_item_id=item_id, quantity=min(quantity, MAX_ITEM_QUANTITY)))
+                break
+            except IntegrityError:
+                continue
+        db.session.commit()
+        return self.get(user_id)
+
+    def remove(self, user_id, item_id):
+        CartItem.query.filter_by(user_id=user_id, menu_item_id=item_id).delete(synchronize_session=False)
+        db.session.commit()
+        return self.get(user_id)
+
+    def clear(self, user_id):
+        CartItem.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+        db.session.commit()
+
+
+class CartStore:
+    """Server-side cart keyed by user id; backend chosen by CART_STORE (memory or sql)"""
+
+    def __init__(self, app=None):
+        self.backend = MemoryCartStore()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get('CART_STORE', 'memory')
+        if kind == 'sql':
+            self.backend = SqlCartStore()
+        elif kind == 'memory':
+            self.backend = MemoryCartStore(
+                max_entries=int(app.config.get('CART_MAX_ENTRIES', 10000)),
+                ttl=int(app.config.get('CART_TTL_SECONDS', 24 * 3600))
+            )
+        else:
+            raise ValueError(f'Unknown CART_STORE {kind!r}')
+        menu_item_lookup.configure(
+            int(app.config.get('MENU_ITEM_CACHE_SIZE', 10000)),
+            int(app.config.get('MENU_ITEM_CACHE_TTL_SECONDS', 60))
+        )
+        app.extensions['cart_store'] = self
+
+    def get(self, user_id):
+        return self.backend.get(user_id)
+
+    def add(self, user_id, item_id, quantity):
+        return self.backend.add(user_id, item_id, quantity)
+
+    def remove(self, user_id, item_id):
+        return self.backend.remove(user_id, item_id)
+
+    def clear(self, user_id):
+        self.backend.clear(user_id)
+
+
+menu_item_lookup = MenuItemLookup()
+cart_store = CartStore()
@@ -0,0 +1,42 @@
+import hashlib
+import uuid
+from datetime import datetime, timezone
+
+from flask import request, jsonify, make_response
+
+# Distinguishes in-process version counters across restarts and workers
+BOOT_ID = uuid.uuid4().hex[:12]
+BOOT_TIME = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def make_etag(*parts):
+    """Strong entity tag from the values that identify a representation's version"""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return digest[:24]
+
+
+def is_fresh(etag, last_modified=None):
+    """True if the client's cached copy matches, checked before any payload is built"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def not_modified(etag, last_modified=None):
+    response = make_response('', 304)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def conditional_json(payload, etag, last_modified=None):
+    response = jsonify(payload)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,123 @@
+import os
+
+from sqlalchemy import event
+
+
+def _bool(name, default):
+    return os.getenv(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def database_url():
+    """DATABASE_URL wins, then SQLALCHEMY_DATABASE_URI, then a local SQLite file"""
+    url = os.getenv('DATABASE_URL') or os.getenv('SQLALCHEMY_DATABASE_URI') or 'sqlite:///swiftserve.db'
+    # Heroku-style URLs use a scheme SQLAlchemy no longer accepts
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS tuned for the selected backend"""
+    if url.startswith('sqlite'):
+        return {
+            'connect_args': {
+                'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000.0,
+                # Greenlets share one OS thread but hand connections between each other
+                'check_same_thread': False
+            }
+        }
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': _bool('DB_POOL_PRE_PING', True)
+    }
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers proceed during a write; busy_timeout waits out the writer instead of failing"""
+    cursor = dbapi_connection.cursor()
+    try:
+        if _bool('SQLITE_WAL', True):
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))}")
+    finally:
+        cursor.close()
+
+
+def install_sqlite_pragmas(engine):
+    """Apply the SQLite connection pragmas to engine's new connections; other backends are left alone"""
+    if engine.dialect.name == 'sqlite' and not event.contains(engine, 'connect', _sqlite_pragmas):
+        event.listen(engine, 'connect', _sqlite_pragmas)
+
+
+class Config:
+    """Application settings read from the environment (.env is loaded by app.py)"""
+
+    def __init__(self):
+        self.SECRET_KEY = os.getenv('SECRET_KEY', 'swiftserve-secret-key-2024')
+        self.SQLALCHEMY_DATABASE_URI = database_url()
+        self.SQLALCHEMY_ENGINE_OPTIONS = engine_options(self.SQLALCHEMY_DATABASE_URI)
+        self.SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+        self.SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+        self.SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'swiftserve')
+        # Skip emits to rooms with no local subscriber; always off with a message queue
+        self.SOCKET_SKIP_EMPTY_ROOMS = _bool('SOCKET_SKIP_EMPTY_ROOMS', True)
+
+        self.MAP_DEFAULT_LAT = float(os.getenv('MAP_DEFAULT_LAT', 12.9716))
+        self.MAP_DEFAULT_LNG = float(os.getenv('MAP_DEFAULT_LNG', 77.5946))
+        self.MAX_DELIVERY_RADIUS_KM = float(os.getenv('MAX_DELIVERY_RADIUS_KM', 10))
+        self.RESTAURANTS_PER_PAGE = int(os.getenv('RESTAURANTS_PER_PAGE', 12))
+
+        self.DELIVERY_AGENT_RADIUS_KM = float(os.getenv('DELIVERY_AGENT_RADIUS_KM', 5))
+        self.DISPATCH_MAX_OFFERS = int(os.getenv('DISPATCH_MAX_OFFERS', 3))
+        self.DISPATCH_OFFER_TTL_SECONDS = int(os.getenv('DISPATCH_OFFER_TTL_SECONDS', 90))
+
+        self.BATCH_ENABLED = _bool('BATCH_ENABLED', True)
+        self.BATCH_PICKUP_RADIUS_KM = float(os.getenv('BATCH_PICKUP_RADIUS_KM', 1.0))
+        self.BATCH_DROPOFF_RADIUS_KM = float(os.getenv('BATCH_DROPOFF_RADIUS_KM', 2.0))
+        self.BATCH_WINDOW_MINUTES = int(os.getenv('BATCH_WINDOW_MINUTES', 10))
+        self.BATCH_MAX_ORDERS = int(os.getenv('BATCH_MAX_ORDERS', 3))
+        self.BATCH_INTERVAL_SECONDS = int(os.getenv('BATCH_INTERVAL_SECONDS', 15))
+
+        self.ORDER_TIMEOUT_MINUTES = int(os.getenv('ORDER_TIMEOUT_MINUTES', 30))
+        self.ORDER_ESCALATION_MINUTES = int(os.getenv('ORDER_ESCALATION_MINUTES', 60))
+        self.ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv('ORDER_ARCHIVE_AFTER_DAYS', 90))
+        self.SWEEP_INTERVAL_SECONDS = int(os.getenv('SWEEP_INTERVAL_SECONDS', 60))
+        self.SWEEP_BATCH_SIZE = int(os.getenv('SWEEP_BATCH_SIZE', 500))
+        self.SWEEP_LEASE_SECONDS = int(os.getenv('SWEEP_LEASE_SECONDS', 180))
+
+        self.LOCATION_FLUSH_INTERVAL_MS = int(os.getenv('LOCATION_FLUSH_INTERVAL_MS', 1000))
+        self.TRAIL_BUFFER_SIZE = int(os.getenv('TRAIL_BUFFER_SIZE', 512))
+        self.TRAIL_FLUSH_INTERVAL_SECONDS = int(os.getenv('TRAIL_FLUSH_INTERVAL_SECONDS', 15))
+        self.TRAIL_MAX_UNFLUSHED = int(os.getenv('TRAIL_MAX_UNFLUSHED', 50000))
+
+        self.ETA_DEFAULT_SPEED_KMH = float(os.getenv('ETA_DEFAULT_SPEED_KMH', 20))
+        self.ETA_ROUTE_FACTOR = float(os.getenv('ETA_ROUTE_FACTOR', 1.3))
+        self.ETA_RECOMPUTE_INTERVAL_SECONDS = int(os.getenv('ETA_RECOMPUTE_INTERVAL_SECONDS', 5))
+        self.ETA_PUSH_THRESHOLD_SECONDS = int(os.getenv('ETA_PUSH_THRESHOLD_SECONDS', 30))
+
+        self.CART_STORE = os.getenv('CART_STORE', 'memory')
+        self.CART_TTL_SECONDS = int(os.getenv('CART_TTL_SECONDS', 24 * 3600))
+        self.MENU_CACHE_SIZE = int(os.getenv('MENU_CACHE_SIZE', 1024))
+        self.MENU_CACHE_TTL_SECONDS = int(os.getenv('MENU_CACHE_TTL_SECONDS', 300))
+        self.MENU_CACHE_HTML = _bool('MENU_CACHE_HTML', True)
+
+        self.PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+        self.PASSWORD_HASH_CONCURRENCY = int(os.getenv('PASSWORD_HASH_CONCURRENCY', 4))
+        self.IDENTITY_CACHE_TTL_SECONDS = int(os.getenv('IDENTITY_CACHE_TTL_SECONDS', 30))
+
+        self.METRICS_ENABLED = _bool('METRICS_ENABLED', True)
+        # Comma-separated addresses allowed to scrape /metrics
+        self.METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1')
+
+        self.PROFILE_ENABLED = _bool('PROFILE_ENABLED', False)
+        self.PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0.0))
+        self.PROFILE_SLOW_MS = int(os.getenv('PROFILE_SLOW_MS', 0))
+        self.PROFILE_INTERVAL_MS = int(os.getenv('PROFILE_INTERVAL_MS', 5))
+        self.PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+        self.PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 200))
+        self.PROFILE_ADMIN_EMAILS = os.getenv('PROFILE_ADMIN_EMAILS', '')
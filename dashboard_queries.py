@@ -0,0 +1,114 @@
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_
+
+from extensions import db
+from models.user import User
+from models.menu_item import MenuItem
+from models.order import Order
+from models.order_item import OrderItem
+import rollups
+
+ACTIVE_STATUSES = ('pending', 'accepted', 'preparing', 'ready_for_pickup', 'picked_up', 'in_transit')
+HISTORY_PAGE_SIZE = 20
+
+
+class OrderRow:
+    """Flat, read-only view of an order as shown on the dashboards"""
+
+    __slots__ = ('id', 'status', 'timestamp', 'total_amount', 'customer_name', 'item_count')
+
+    def __init__(self, id, status, timestamp, total_amount, customer_name, item_count):
+        self.id = id
+        self.status = status
+        self.timestamp = timestamp
+        self.total_amount = total_amount
+        self.customer_name = customer_name
+        self.item_count = item_count
+
+    def get_status_display(self):
+        return (self.status or '').replace('_', ' ').title()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'total_amount': self.total_amount,
+            'customer_name': self.customer_name,
+            'item_count': self.item_count
+        }
+
+
+def encode_cursor(row):
+    return f'{row.timestamp.isoformat()}_{row.id}'
+
+
+def decode_cursor(cursor):
+    """Parse a history cursor, returning (timestamp, id) or None if malformed"""
+    if not cursor:
+        return None
+    try:
+        timestamp, order_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(order_id)
+    except ValueError:
+        return None
+
+
+def _order_rows_query(restaurant_id):
+    # Correlated per returned row, so only the page's orders are counted (via ix_order_item_order_id)
+    item_count = db.session.query(func.count(OrderItem.id)) \
+        .filter(OrderItem.order_id == Order.id) \
+        .correlate(Order).scalar_subquery()
+
+    return db.session.query(
+        Order.id,
+        Order.status,
+        Order.timestamp,
+        Order.total_amount,
+        User.name,
+        item_count
+    ).join(User, User.id == Order.customer_id) \
+        .filter(Order.restaurant_id == restaurant_id)
+
+
+def active_orders(restaurant_id):
+    """Orders still in progress, newest first"""
+    rows = _order_rows_query(restaurant_id) \
+        .filter(Order.status.in_(ACTIVE_STATUSES)) \
+        .order_by(Order.timestamp.desc(), Order.id.desc()).all()
+    return [OrderRow(*row) for row in rows]
+
+
+def order_history(restaurant_id, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """Keyset-paginated order history, newest first.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    query = _order_rows_query(restaurant_id)
+    position = decode_cursor(cursor)
+    if position:
+        timestamp, order_id = position
+        query = query.filter(or_(
+            Order.timestamp < timestamp,
+            and_(Order.timestamp == timestamp, Order.id < order_id)
+        ))
+    rows = [OrderRow(*row) for row in query.order_by(Order.timestamp.desc(), Order.id.desc()).limit(limit + 1).all()]
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def restaurant_stats(restaurant_id):
+    """Dashboard stat cards: lifetime counts from the rollups, the pending count live off the status index"""
+    totals = rollups.totals(restaurant_id)
+    pending = db.session.query(func.count(Order.id)) \
+        .filter(Order.restaurant_id == restaurant_id, Order.status == 'pending').scalar()
+    menu_items = db.session.query(func.count(MenuItem.id)) \
+        .filter(MenuItem.restaurant_id == restaurant_id).scalar()
+
+    return {
+        'menu_items': menu_items or 0,
+        'total_orders': totals.get('placed', 0),
+        'pending_orders': pending or 0,
+        'delivered_orders': totals.get('delivered', 0)
+    }
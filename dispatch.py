@@ -0,0 +1,169 @@
+import threading
+import time
+
+from sqlalchemy import func
+
+from extensions import db, socketio
+from geo import GridIndex
+from models.order import Order
+from order_events import order_delta, order_feed
+from subscriptions import subscriptions
+
+IN_PROGRESS_STATUSES = ('picked_up', 'in_transit')
+
+
+class Dispatcher:
+    """Offers ready orders to a bounded set of nearby available agents.
+
+    Agent positions live in a grid index fed by location pings, so choosing
+    candidates never scans the user table. Offers are held in memory and
+    expire; an order nobody claims is re-offered to the next-best agents,
+    and an order with no agent nearby is retried on every loop tick.
+    """
+
+    def __init__(self, app=None):
+        self._agents = GridIndex(cell_size_km=1.0)
+        self._available = set()
+        self._offers = {}
+        self._lock = threading.Lock()
+        self.radius_km = 5.0
+        self.max_offers = 3
+        self.offer_ttl = 90
+        self.load_penalty_km = 2.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.radius_km = float(app.config.get('DELIVERY_AGENT_RADIUS_KM', self.radius_km))
+        self.max_offers = int(app.config.get('DISPATCH_MAX_OFFERS', self.max_offers))
+        self.offer_ttl = int(app.config.get('DISPATCH_OFFER_TTL_SECONDS', self.offer_ttl))
+        self.load_penalty_km = float(app.config.get('DISPATCH_LOAD_PENALTY_KM', self.load_penalty_km))
+        app.extensions['dispatcher'] = self
+
+    # Agent state
+
+    def update_agent_location(self, agent_id, latitude, longitude):
+        self._agents.upsert(agent_id, latitude, longitude)
+
+    def set_agent_available(self, agent_id, is_available, latitude=None, longitude=None):
+        with self._lock:
+            if is_available:
+                self._available.add(agent_id)
+            else:
+                self._available.discard(agent_id)
+        if is_available and agent_id not in self._agents:
+            self._agents.upsert(agent_id, latitude, longitude)
+
+    def agent_position(self, agent_id):
+        return self._agents.position(agent_id)
+
+    def nearest_available(self, latitude, longitude):
+        """Position of the closest available agent within DELIVERY_AGENT_RADIUS_KM, or None"""
+        for _, agent_id in self._agents.within(latitude, longitude, self.radius_km):
+            if agent_id in self._available:
+                return self._agents.position(agent_id)
+        return None
+
+    def _agent_loads(self, agent_ids):
+        if not agent_ids:
+            return {}
+        rows = db.session.query(Order.agent_id, func.count(Order.id)) \
+            .filter(Order.agent_id.in_(agent_ids), Order.status.in_(IN_PROGRESS_STATUSES)) \
+            .group_by(Order.agent_id).all()
+        return dict(rows)
+
+    # Offers
+
+    def candidates(self, latitude, longitude, exclude=()):
+        """Available agents near a pickup point as [(score, agent_id, distance_km)]"""
+        nearby = [(distance, agent_id) for distance, agent_id in self._agents.within(latitude, longitude, self.radius_km)
+                  if agent_id in self._available and agent_id not in exclude]
+        loads = self._agent_loads([agent_id for _, agent_id in nearby])
+        scored = [(distance + self.load_penalty_km * loads.get(agent_id, 0), agent_id, distance)
+                  for distance, agent_id in nearby]
+        scored.sort()
+        return scored[:self.max_offers]
+
+    def offer(self, order):
+        """Offer a ready order to the best candidate agents; returns their ids"""
+        restaurant = order.restaurant
+        if restaurant is None or restaurant.latitude is None or restaurant.longitude is None:
+            return []
+
+        with self._lock:
+            previous = self._offers.get(order.id)
+            already_offered = previous['agents'] if previous else set()
+
+        chosen = self.candidates(restaurant.latitude, restaurant.longitude, exclude=already_offered)
+        if not chosen:
+            # Keep an already-expired entry so redispatch_expired tries again once agents appear;
+            # every nearby agent having passed on it, the next round may offer it to them again
+            with self._lock:
+                entry = self._offers.setdefault(order.id, {'agents': set(), 'expires': 0})
+                entry['agents'] = set()
+                entry['active'] = set()
+                entry['expires'] = 0
+            return []
+
+        agent_ids = [agent_id for _, agent_id, _ in chosen]
+        with self._lock:
+            entry = self._offers.setdefault(order.id, {'agents': set(), 'expires': 0})
+            entry['agents'].update(agent_ids)
+            entry['active'] = set(agent_ids)
+            entry['expires'] = time.time() + self.offer_ttl
+
+        # Built once, for the first offered agent who has the dashboard open
+        delta = None
+        for _, agent_id, distance in chosen:
+            if delta is None and subscriptions.has_subscribers(f'agent_{agent_id}'):
+                delta = order_delta(order)
+            order_feed.publish('new_delivery_assignment', delta, [f'agent_{agent_id}'],
+                               restaurant_name=restaurant.name, distance_km=round(distance, 2))
+        return agent_ids
+
+    def offers_for(self, agent_id):
+        """Order ids currently offered to an agent"""
+        now = time.time()
+        with self._lock:
+            return [order_id for order_id, entry in self._offers.items()
+                    if entry['expires'] > now and agent_id in entry.get('active', ())]
+
+    def withdraw(self, order_id):
+        """Drop all offers for an order once it is claimed or cancelled; returns the agents it was offered to"""
+        with self._lock:
+            entry = self._offers.pop(order_id, None)
+        return entry.get('active', set()) if entry else set()
+
+    def redispatch_expired(self):
+        """Re-offer orders whose offers lapsed without a claim"""
+        now = time.time()
+        with self._lock:
+            expired = [order_id for order_id, entry in self._offers.items() if entry['expires'] <= now]
+        if not expired:
+            return 0
+
+        orders = Order.query.filter(Order.id.in_(expired), Order.status == 'ready_for_pickup',
+                                    Order.agent_id.is_(None)).all()
+        still_ready = set()
+        for order in orders:
+            still_ready.add(order.id)
+            self.offer(order)
+        for order_id in set(expired) - still_ready:
+            self.withdraw(order_id)
+        return len(orders)
+
+    def run(self, app, interval=10):
+        """Background loop re-offering unclaimed orders; start with socketio.start_background_task"""
+        while True:
+            socketio.sleep(interval)
+            with app.app_context():
+                try:
+                    self.redispatch_expired()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Order redispatch failed')
+                finally:
+                    db.session.remove()
+
+
+dispatcher = Dispatcher()
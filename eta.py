@@ -0,0 +1,260 @@
+import threading
+import time
+
+import numpy as np
+
+from extensions import db, socketio
+from geo import EARTH_RADIUS_KM, haversine_km as point_distance_km
+from models.user import User
+from models.restaurant import Restaurant
+from models.order import Order
+from subscriptions import subscriptions
+
+TRACKED_STATUSES = ('accepted', 'preparing', 'ready_for_pickup', 'picked_up', 'in_transit')
+PICKED_UP_STATUSES = ('picked_up', 'in_transit')
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Element-wise great-circle distance in kilometres between arrays of points"""
+    lat1, lon1, lat2, lon2 = (np.radians(values) for values in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class Route:
+    """Fixed endpoints of one delivery plus the agent's latest position"""
+
+    __slots__ = ('order_id', 'status', 'agent_id', 'restaurant', 'customer', 'agent')
+
+    def __init__(self, order_id, status, agent_id, restaurant, customer, agent=None):
+        self.order_id = order_id
+        self.status = status
+        self.agent_id = agent_id
+        self.restaurant = restaurant
+        self.customer = customer
+        self.agent = agent
+
+
+class EtaService:
+    """Batched delivery ETAs for live orders.
+
+    Orders are tracked from acceptance. Location pings update the agent's
+    smoothed speed and mark the order dirty; orders not yet picked up are
+    re-estimated every pass from the nearest available agent (locate_agent).
+    The background loop recomputes all dirty orders in one vectorised pass
+    (agent -> restaurant -> customer, straight-line distance scaled by
+    ETA_ROUTE_FACTOR) and pushes an order_status_update to the order room
+    only when the arrival time moved by ETA_PUSH_THRESHOLD_SECONDS.
+    """
+
+    def __init__(self, app=None):
+        self.default_speed = 20.0
+        self.min_speed = 5.0
+        self.max_speed = 60.0
+        self.route_factor = 1.3
+        self.handoff_seconds = 120
+        self.push_threshold = 30
+        self.interval = 5
+        self.smoothing = 0.3
+        self.locate_agent = None
+        self._routes = {}
+        self._speeds = {}
+        self._last_ping = {}
+        self._estimates = {}
+        self._pushed = {}
+        self._dirty = set()
+        self._loaded = False
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.default_speed = float(app.config.get('ETA_DEFAULT_SPEED_KMH', self.default_speed))
+        self.min_speed = float(app.config.get('ETA_MIN_SPEED_KMH', self.min_speed))
+        self.max_speed = float(app.config.get('ETA_MAX_SPEED_KMH', self.max_speed))
+        self.route_factor = float(app.config.get('ETA_ROUTE_FACTOR', self.route_factor))
+        self.handoff_seconds = int(app.config.get('ETA_HANDOFF_SECONDS', self.handoff_seconds))
+        self.push_threshold = int(app.config.get('ETA_PUSH_THRESHOLD_SECONDS', self.push_threshold))
+        self.interval = int(app.config.get('ETA_RECOMPUTE_INTERVAL_SECONDS', self.interval))
+        app.extensions['eta_service'] = self
+
+    # Route registry
+
+    def _route_query(self):
+        return db.session.query(Order.id, Order.status, Order.agent_id, Restaurant.latitude, Restaurant.longitude,
+                                User.latitude, User.longitude) \
+            .join(Restaurant, Restaurant.id == Order.restaurant_id) \
+            .join(User, User.id == Order.customer_id)
+
+    def _add_routes(self, rows):
+        with self._lock:
+            for order_id, status, agent_id, r_lat, r_lon, c_lat, c_lon in rows:
+                if None in (r_lat, r_lon, c_lat, c_lon):
+                    continue
+                existing = self._routes.get(order_id)
+                self._routes[order_id] = Route(order_id, status, agent_id, (r_lat, r_lon), (c_lat, c_lon),
+                                               existing.agent if existing else None)
+                self._dirty.add(order_id)
+
+    def ensure_loaded(self):
+        if self._loaded:
+            return
+        self._add_routes(self._route_query().filter(Order.status.in_(TRACKED_STATUSES)).all())
+        self._loaded = True
+
+    def track(self, order_id):
+        """Start (or refresh) tracking an order after a status change"""
+        self._add_routes(self._route_query().filter(Order.id == order_id).all())
+
+    def forget(self, order_id):
+        with self._lock:
+            self._routes.pop(order_id, None)
+            self._estimates.pop(order_id, None)
+            self._pushed.pop(order_id, None)
+            self._dirty.discard(order_id)
+
+    # Pings
+
+    def observe(self, order_id, timestamp, latitude, longitude, agent_id=None):
+        """Location-coalescer listener: update agent speed and mark the order for recompute"""
+        with self._lock:
+            if agent_id is not None:
+                previous = self._last_ping.get(agent_id)
+                self._last_ping[agent_id] = (timestamp, latitude, longitude)
+                if previous is not None and timestamp - previous[0] >= 1.0:
+                    hours = (timestamp - previous[0]) / 3600.0
+                    distance = point_distance_km(previous[1], previous[2], latitude, longitude)
+                    speed = distance / hours
+                    # A jump faster than max_speed is GPS noise, not movement
+                    if speed <= self.max_speed * 1.5:
+                        current = self._speeds.get(agent_id, self.default_speed)
+                        self._speeds[agent_id] = current + self.smoothing * (speed - current)
+            route = self._routes.get(order_id)
+            if route is not None:
+                route.agent = (latitude, longitude)
+                self._dirty.add(order_id)
+
+    def _locate(self, routes):
+        # Nobody is assigned before pickup, so the agent leg starts from the
+        # nearest available agent (or the restaurant itself when there is none)
+        if self.locate_agent is None:
+            return
+        for route in routes:
+            if route.status not in PICKED_UP_STATUSES:
+                route.agent = self.locate_agent(*route.restaurant)
+
+    def agent_speed(self, agent_id):
+        speed = self._speeds.get(agent_id, self.default_speed)
+        return min(self.max_speed, max(self.min_speed, speed))
+
+    # Computation
+
+    def compute(self, routes, now=None):
+        """Vectorised ETAs for a list of Routes; returns {order_id: estimate}"""
+        if not routes:
+            return {}
+        now = now or time.time()
+        restaurant = np.array([r.restaurant for r in routes], dtype=float)
+        customer = np.array([r.customer for r in routes], dtype=float)
+        # Without a known position the agent is assumed to be at the restaurant
+        agent = np.array([r.agent or r.restaurant for r in routes], dtype=float)
+        picked = np.array([r.status in PICKED_UP_STATUSES for r in routes])
+        speed = np.array([self.agent_speed(r.agent_id) for r in routes], dtype=float)
+
+        to_restaurant = np.where(picked, 0.0, haversine_km(agent[:, 0], agent[:, 1], restaurant[:, 0], restaurant[:, 1]))
+        to_customer = np.where(picked,
+                               haversine_km(agent[:, 0], agent[:, 1], customer[:, 0], customer[:, 1]),
+                               haversine_km(restaurant[:, 0], restaurant[:, 1], customer[:, 0], customer[:, 1]))
+        distance = (to_restaurant + to_customer) * self.route_factor
+        seconds = distance / speed * 3600.0 + np.where(picked, 0, self.handoff_seconds)
+
+        return dict((route.order_id, {
+            'eta_seconds': int(round(seconds[i])),
+            'eta_at': now + float(seconds[i]),
+            'distance_km': round(float(distance[i]), 2),
+            'speed_kmh': round(float(speed[i]), 1),
+            'computed_at': now
+        }) for i, route in enumerate(routes))
+
+    def recompute(self):
+        """Recompute every dirty order in one batch; returns ids whose ETA moved enough to push"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            # Unassigned orders get no pings, but the agents around them move
+            dirty.update(order_id for order_id, route in self._routes.items()
+                         if route.status not in PICKED_UP_STATUSES)
+            routes = [self._routes[order_id] for order_id in dirty if order_id in self._routes]
+        self._locate(routes)
+        estimates = self.compute(routes)
+        changed = []
+        with self._lock:
+            for order_id, estimate in estimates.items():
+                if order_id not in self._routes:
+                    continue
+                self._estimates[order_id] = estimate
+                pushed = self._pushed.get(order_id)
+                if pushed is None or abs(estimate['eta_at'] - pushed) >= self.push_threshold:
+                    self._pushed[order_id] = estimate['eta_at']
+                    changed.append(order_id)
+        return changed
+
+    def estimate(self, order_id):
+        """Latest estimate for a tracked order, computing it now if it is pending"""
+        with self._lock:
+            route = self._routes.get(order_id)
+            estimate = self._estimates.get(order_id)
+            stale = order_id in self._dirty
+        if route is None:
+            return None
+        if estimate is None or stale:
+            self._locate([route])
+            estimate = self.compute([route])[order_id]
+        return self.payload(estimate)
+
+    def preview(self, order_id, agent_position):
+        """One-off estimate for an order that is not tracked yet, e.g. an offer shown to an agent"""
+        row = self._route_query().filter(Order.id == order_id).first()
+        if row is None or None in row[3:]:
+            return None
+        order_id, status, agent_id, r_lat, r_lon, c_lat, c_lon = row
+        route = Route(order_id, status, agent_id, (r_lat, r_lon), (c_lat, c_lon), agent_position)
+        return dict(self.payload(self.compute([route])[order_id]),
+                    restaurant={'latitude': r_lat, 'longitude': r_lon},
+                    customer={'latitude': c_lat, 'longitude': c_lon})
+
+    @staticmethod
+    def payload(estimate):
+        return {
+            'eta_seconds': max(0, int(round(estimate['eta_at'] - time.time()))),
+            'eta_at': estimate['eta_at'],
+            'distance_km': estimate['distance_km']
+        }
+
+    def push(self, order_ids):
+        for order_id in order_ids:
+            if not subscriptions.has_subscribers(f'order_{order_id}'):
+                continue
+            with self._lock:
+                route = self._routes.get(order_id)
+                estimate = self._estimates.get(order_id)
+            if route is None or estimate is None:
+                continue
+            socketio.emit('order_status_update', dict(self.payload(estimate), order_id=order_id, status=route.status,
+                                                      eta_only=True), room=f'order_{order_id}')
+
+    def run(self, app):
+        """Background recompute loop; start with socketio.start_background_task"""
+        while True:
+            socketio.sleep(self.interval)
+            with app.app_context():
+                try:
+                    self.ensure_loaded()
+                    self.push(self.recompute())
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('ETA recompute failed')
+                finally:
+                    db.session.remove()
+
+
+eta_service = EtaService()
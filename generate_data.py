@@ -0,0 +1,316 @@
+"""Generate large, reproducible datasets for load testing.
+
+    python generate_data.py --users 100000 --restaurants 10000 --orders 1000000
+
+Rows are written with bulk inserts, one chunk per transaction, and every
+chunk's progress is committed alongside it in `datagen_progress`. Rerunning
+the same command after an interruption resumes from the last finished chunk
+and produces exactly the rows an uninterrupted run would have, because each
+chunk draws from its own generator seeded by (seed, tag, table, chunk).
+
+All generated users share the password given by --password.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, func, insert, text
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+import migrations
+import rollups
+from passwords import password_hasher
+from models.user import User
+from models.restaurant import Restaurant
+from models.menu_item import MenuItem
+from models.order import Order
+from models.order_item import OrderItem
+
+KM_PER_DEGREE = 111.32
+CUISINES = ['American', 'Italian', 'Indian', 'Japanese', 'Chinese', 'Thai', 'Mexican', 'Mediterranean']
+DISHES = ['Burger', 'Pizza', 'Biryani', 'Curry', 'Noodles', 'Roll', 'Salad', 'Wrap', 'Soup', 'Dessert']
+STREETS = ['MG Road', 'Brigade Road', 'Koramangala', 'Indiranagar', 'Jayanagar', 'Whitefield', 'HSR Layout']
+# Weighted so the bulk of history is finished orders with a thin live tail
+STATUS_WEIGHTS = [
+    ('delivered', 82), ('cancelled', 6), ('pending', 2), ('accepted', 2), ('preparing', 2),
+    ('ready_for_pickup', 2), ('picked_up', 2), ('in_transit', 2)
+]
+AGENT_STATUSES = ('picked_up', 'in_transit', 'delivered')
+
+_meta = MetaData()
+datagen_progress = Table(
+    'datagen_progress', _meta,
+    Column('tag', String(50), primary_key=True),
+    Column('stage', String(20), primary_key=True),
+    Column('base_id', Integer, nullable=False),
+    Column('chunks_done', Integer, nullable=False, default=0),
+    Column('reference_time', DateTime, nullable=False),
+    Column('updated_at', Float, nullable=False)
+)
+
+
+class Plan:
+    """Row counts and id layout shared by every stage of one generation run"""
+
+    def __init__(self, args, center_lat, center_lng):
+        self.args = args
+        self.tag = args.tag
+        self.users = args.users
+        self.restaurants = args.restaurants
+        self.menu_items = args.menu_items
+        self.orders = args.orders
+        # The app resolves an owner's restaurant with .first(), so every restaurant gets its own owner
+        self.owners = args.restaurants
+        self.agents = max(1, int(args.users * args.agent_share))
+        if self.owners + self.agents >= self.users:
+            raise SystemExit('--users is too small for the requested restaurants and agent share')
+        self.customers = self.users - self.owners - self.agents
+
+        rng = random.Random(f'{args.seed}:{args.tag}:clusters')
+        self.clusters = []
+        for _ in range(args.clusters):
+            distance = args.spread_km * math.sqrt(rng.random())
+            bearing = rng.uniform(0, 2 * math.pi)
+            self.clusters.append(offset_km(center_lat, center_lng,
+                                           distance * math.cos(bearing), distance * math.sin(bearing)))
+        self.base = {}
+        self.reference_time = None
+
+    # Users are laid out as [owners | agents | customers]; entity i belongs to cluster i % clusters
+
+    def owner_id(self, restaurant_index):
+        return self.base['users'] + restaurant_index
+
+    def agent_id(self, rng):
+        return self.base['users'] + self.owners + rng.randrange(self.agents)
+
+    def customer_index(self, rng):
+        return rng.randrange(self.customers)
+
+    def restaurant_near(self, rng, cluster):
+        k = len(self.clusters)
+        in_cluster = (self.restaurants - cluster + k - 1) // k
+        if in_cluster <= 0:
+            return rng.randrange(self.restaurants)
+        return cluster + k * rng.randrange(in_cluster)
+
+    def point(self, rng, cluster):
+        lat, lng = self.clusters[cluster]
+        sigma = self.args.cluster_radius_km
+        return offset_km(lat, lng, rng.gauss(0, sigma), rng.gauss(0, sigma))
+
+
+def offset_km(lat, lng, north_km, east_km):
+    return (round(lat + north_km / KM_PER_DEGREE, 6),
+            round(lng + east_km / (KM_PER_DEGREE * math.cos(math.radians(lat))), 6))
+
+
+def menu_price(restaurant_index, position):
+    return 40 + ((restaurant_index * 31 + position * 17) % 40) * 10
+
+
+# Chunk builders: (plan, rng, start, stop) -> {table: rows}
+
+def build_users(plan, rng, start, stop, password_hash):
+    rows = []
+    for i in range(start, stop):
+        if i < plan.owners:
+            role = 'restaurant'
+        elif i < plan.owners + plan.agents:
+            role = 'delivery_agent'
+        else:
+            role = 'customer'
+        lat, lng = plan.point(rng, i % len(plan.clusters))
+        rows.append({
+            'id': plan.base['users'] + i,
+            'name': f"{role.replace('_', ' ').title()} {i}",
+            'email': f'{plan.tag}-{i}@example.com',
+            'password': password_hash,
+            'role': role,
+            'latitude': lat,
+            'longitude': lng,
+            'is_available': role == 'delivery_agent' and rng.random() < 0.5
+        })
+    return {User: rows}
+
+
+def build_restaurants(plan, rng, start, stop):
+    restaurants, items = [], []
+    for r in range(start, stop):
+        lat, lng = plan.point(rng, r % len(plan.clusters))
+        restaurant_id = plan.base['restaurants'] + r
+        restaurants.append({
+            'id': restaurant_id,
+            'owner_id': plan.owner_id(r),
+            'name': f'{rng.choice(CUISINES)} Kitchen {r}',
+            'address': f'{rng.randint(1, 999)} {rng.choice(STREETS)}',
+            'cuisine_type': CUISINES[r % len(CUISINES)],
+            'latitude': lat,
+            'longitude': lng,
+            'is_active': rng.random() < 0.9
+        })
+        for position in range(plan.menu_items):
+            items.append({
+                'id': plan.base['menu_items'] + r * plan.menu_items + position,
+                'restaurant_id': restaurant_id,
+                'name': f'{DISHES[(r + position) % len(DISHES)]} #{position + 1}',
+                'price': menu_price(r, position),
+                'description': 'Generated menu item',
+                'is_available': rng.random() < 0.95
+            })
+    return {Restaurant: restaurants, MenuItem: items}
+
+
+def build_orders(plan, rng, start, stop):
+    statuses = [status for status, _ in STATUS_WEIGHTS]
+    weights = [weight for _, weight in STATUS_WEIGHTS]
+    window = plan.args.days * 86400
+    orders, lines = [], []
+    for o in range(start, stop):
+        customer = plan.customer_index(rng)
+        r = plan.restaurant_near(rng, (plan.owners + plan.agents + customer) % len(plan.clusters))
+        status = rng.choices(statuses, weights)[0]
+        # Live orders are recent; history spreads over the whole window
+        age = rng.uniform(0, 3600) if status not in ('delivered', 'cancelled') else rng.uniform(0, window)
+        order_id = plan.base['orders'] + o
+
+        total = 0
+        for position in rng.sample(range(plan.menu_items), rng.randint(1, min(plan.args.max_lines, plan.menu_items))):
+            quantity = rng.randint(1, 3)
+            price = menu_price(r, position)
+            total += price * quantity
+            lines.append({
+                'order_id': order_id,
+                'menu_item_id': plan.base['menu_items'] + r * plan.menu_items + position,
+                'quantity': quantity,
+                'price_at_order': price
+            })
+        orders.append({
+            'id': order_id,
+            'customer_id': plan.base['users'] + plan.owners + plan.agents + customer,
+            'restaurant_id': plan.base['restaurants'] + r,
+            'agent_id': plan.agent_id(rng) if status in AGENT_STATUSES else None,
+            'status': status,
+            'total_amount': total,
+            'delivery_address': f'{rng.randint(1, 999)} {rng.choice(STREETS)}',
+            'timestamp': plan.reference_time - timedelta(seconds=age)
+        })
+    return {Order: orders, OrderItem: lines}
+
+
+def next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def load_progress(plan):
+    """Read or create the progress rows for this tag; fixes base ids on the first run"""
+    with db.engine.begin() as connection:
+        _meta.create_all(bind=connection)
+    rows = db.session.execute(datagen_progress.select().where(datagen_progress.c.tag == plan.tag)).mappings().all()
+    progress = {row['stage']: row for row in rows}
+    if not progress:
+        now = datetime.utcnow().replace(microsecond=0)
+        stages = {'users': next_id(User), 'restaurants': next_id(Restaurant),
+                  'menu_items': next_id(MenuItem), 'orders': next_id(Order)}
+        db.session.execute(insert(datagen_progress), [
+            {'tag': plan.tag, 'stage': stage, 'base_id': base_id, 'chunks_done': 0,
+             'reference_time': now, 'updated_at': time.time()}
+            for stage, base_id in stages.items()
+        ])
+        db.session.commit()
+        return load_progress(plan)
+    for stage, row in progress.items():
+        plan.base[stage] = row['base_id']
+        plan.reference_time = row['reference_time']
+    return {stage: row['chunks_done'] for stage, row in progress.items()}
+
+
+def run_stage(plan, stage, total, builder, done, *extra):
+    chunk_size = plan.args.chunk_size
+    chunks = (total + chunk_size - 1) // chunk_size
+    if done.get(stage, 0) >= chunks:
+        print(f'{stage}: already complete ({total} rows)')
+        return
+    started = time.time()
+    for chunk in range(done.get(stage, 0), chunks):
+        start = chunk * chunk_size
+        stop = min(total, start + chunk_size)
+        rng = random.Random(f'{plan.args.seed}:{plan.tag}:{stage}:{chunk}')
+        try:
+            for model, rows in builder(plan, rng, start, stop, *extra).items():
+                if rows:
+                    db.session.execute(insert(model), rows)
+            db.session.execute(datagen_progress.update()
+                               .where(datagen_progress.c.tag == plan.tag, datagen_progress.c.stage == stage)
+                               .values(chunks_done=chunk + 1, updated_at=time.time()))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        elapsed = time.time() - started
+        print(f'{stage}: {stop}/{total} rows ({stop / max(elapsed, 1e-6):.0f} rows/s overall)', flush=True)
+
+
+def sync_sequences():
+    """Explicit ids bypass Postgres sequences; move them past the generated rows"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for model in (User, Restaurant, MenuItem, Order):
+        table = model.__table__.name
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+            f"(SELECT COALESCE(MAX(id), 1) FROM \"{table}\"))"))
+    db.session.commit()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic SwiftServe data for load testing')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--restaurants', type=int, default=10000)
+    parser.add_argument('--orders', type=int, default=1000000)
+    parser.add_argument('--menu-items', type=int, default=12, help='menu items per restaurant')
+    parser.add_argument('--max-lines', type=int, default=4, help='max line items per order')
+    parser.add_argument('--agent-share', type=float, default=0.05, help='fraction of users that are delivery agents')
+    parser.add_argument('--clusters', type=int, default=25, help='neighbourhood hot spots around the map centre')
+    parser.add_argument('--spread-km', type=float, default=15.0, help='radius the clusters are scattered over')
+    parser.add_argument('--cluster-radius-km', type=float, default=1.5, help='std deviation of points around a cluster')
+    parser.add_argument('--days', type=int, default=180, help='how far back order history goes')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--tag', default='load', help='names a run; rerun with the same tag to resume it')
+    parser.add_argument('--password', default='password123')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with app.app_context():
+        migrations.upgrade()
+        plan = Plan(args, app.config['MAP_DEFAULT_LAT'], app.config['MAP_DEFAULT_LNG'])
+        done = load_progress(plan)
+
+        # One hash for every generated user; hashing per row would dominate the run
+        password_hash = password_hasher.hash(args.password)
+
+        run_stage(plan, 'users', plan.users, build_users, done, password_hash)
+        run_stage(plan, 'restaurants', plan.restaurants, build_restaurants, done)
+        run_stage(plan, 'orders', plan.orders, build_orders, done)
+        sync_sequences()
+
+        print('Rebuilding order rollups...')
+        with db.engine.begin() as connection:
+            rollups.rebuild(connection)
+        print(f"\nDone. Log in as {args.tag}-0@example.com (restaurant), "
+              f"{args.tag}-{plan.owners}@example.com (delivery) or "
+              f"{args.tag}-{plan.owners + plan.agents}@example.com (customer) with password '{args.password}'.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import math
+import threading
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class GridIndex:
+    """In-memory spatial index bucketing points into fixed-size lat/lon cells.
+
+    Points are keyed by an id and can be inserted, moved or removed one at a
+    time, so the index is maintained incrementally instead of being rebuilt.
+    """
+
+    def __init__(self, cell_size_km=2.0):
+        self.cell_deg = cell_size_km / KM_PER_DEGREE_LAT
+        self._cells = {}
+        self._points = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def _cell(self, lat, lon):
+        return (int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg)))
+
+    def upsert(self, key, lat, lon):
+        if lat is None or lon is None:
+            self.remove(key)
+            return
+        cell = self._cell(lat, lon)
+        with self._lock:
+            previous = self._points.get(key)
+            if previous is not None and previous[2] != cell:
+                bucket = self._cells.get(previous[2])
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._cells[previous[2]]
+            self._points[key] = (lat, lon, cell)
+            self._cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        with self._lock:
+            previous = self._points.pop(key, None)
+            if previous is None:
+                return
+            bucket = self._cells.get(previous[2])
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._cells[previous[2]]
+
+    def position(self, key):
+        point = self._points.get(key)
+        return (point[0], point[1]) if point else None
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+
+    def within(self, lat, lon, radius_km):
+        """Return [(distance_km, key)] within radius, nearest first"""
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        lon_span = radius_km / (KM_PER_DEGREE_LAT * cos_lat)
+        min_row, min_col = self._cell(lat - lat_span, lon - lon_span)
+        max_row, max_col = self._cell(lat + lat_span, lon + lon_span)
+
+        results = []
+        with self._lock:
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    for key in self._cells.get((row, col), ()):
+                        point = self._points[key]
+                        distance = haversine_km(lat, lon, point[0], point[1])
+                        if distance <= radius_km:
+                            results.append((distance, key))
+        results.sort()
+        return results
@@ -0,0 +1,75 @@
+from extensions import db
+from caching import TTLCache
+from models.user import User
+
+
+class UserSnapshot:
+    """Compact, read-only stand-in for User as current_user.
+
+    Implements the Flask-Login user interface itself so instances carry no
+    __dict__; anything that needs to write to the user row must load or
+    update the User model explicitly.
+    """
+
+    __slots__ = ('id', 'name', 'email', 'role', 'is_available', 'latitude', 'longitude')
+
+    def __init__(self, id, name, email, role, is_available, latitude, longitude):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.role = role
+        self.is_available = is_available
+        self.latitude = latitude
+        self.longitude = longitude
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_active(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    def get_id(self):
+        return str(self.id)
+
+
+class IdentityCache:
+    """Short-lived cache of UserSnapshots backing the login manager's user_loader"""
+
+    def __init__(self, app=None):
+        self._cache = TTLCache(10000, 30)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._cache = TTLCache(
+            int(app.config.get('IDENTITY_CACHE_SIZE', 10000)),
+            int(app.config.get('IDENTITY_CACHE_TTL_SECONDS', 30))
+        )
+        app.extensions['identity_cache'] = self
+
+    def load(self, user_id):
+        snapshot = self._cache.get(user_id)
+        if snapshot is not None:
+            return snapshot
+        row = db.session.query(User.id, User.name, User.email, User.role, User.is_available,
+                               User.latitude, User.longitude).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        snapshot = UserSnapshot(*row)
+        self._cache.set(user_id, snapshot)
+        return snapshot
+
+    def invalidate(self, user_id):
+        self._cache.pop(user_id)
+
+    def clear(self):
+        self._cache.clear()
+
+
+identity_cache = IdentityCache()
@@ -8,6 +8,8 @@ import random
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app import app, db
+import migrations
+import rollups
 from models.user import User
 from models.restaurant import Restaurant
 from models.menu_item import MenuItem
@@ -250,12 +252,14 @@ def create_sample_data():
 
 def main():
     with app.app_context():
-        print("Creating database tables...")
-        db.create_all()
-        print("Database tables created successfully!")
+        print("Applying schema migrations...")
+        migrations.upgrade()
+        print("Database schema is up to date!")
         
         print("\nCreating sample data...")
         create_sample_data()
+        with db.engine.begin() as connection:
+            rollups.rebuild(connection)
         print("\nDatabase initialization completed!")
 
 if __name__ == '__main__':
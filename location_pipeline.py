@@ -0,0 +1,169 @@
+import math
+import threading
+import time
+from datetime import datetime, timezone
+
+from caching import TTLCache
+from extensions import db, socketio
+from models.order import Order
+from subscriptions import subscriptions
+
+REPORTING_STATUSES = ('picked_up', 'in_transit')
+
+
+def parse_timestamp(value, default):
+    """Accept epoch seconds, epoch milliseconds or an ISO-8601 string; None if unusable"""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        try:
+            value = float(value)
+        except OverflowError:
+            return None
+        # NaN would slip past every age comparison and fail later in utcfromtimestamp
+        if not math.isfinite(value):
+            return None
+        return value / 1000.0 if value > 1e11 else value
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def valid_coordinates(latitude, longitude):
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        return None
+    return latitude, longitude
+
+
+class AssignmentLookup:
+    """Cached order id -> (agent_id, status), used to check who may report an order's position"""
+
+    def __init__(self, max_entries=10000, ttl=30):
+        self._cache = TTLCache(max_entries, ttl)
+
+    def configure(self, max_entries, ttl):
+        self._cache = TTLCache(max_entries, ttl)
+
+    def _load(self, order_id):
+        row = db.session.query(Order.agent_id, Order.status).filter(Order.id == order_id).first()
+        entry = tuple(row) if row is not None else None
+        self._cache.set(order_id, entry)
+        return entry
+
+    def may_report(self, order_id, agent_id):
+        """True if agent_id is assigned to the order and it is out for delivery"""
+        entry = self._cache.get(order_id)
+        if entry is None or entry[0] != agent_id:
+            # Re-check a miss or a mismatch: the order may have been claimed a moment ago
+            entry = self._load(order_id)
+        return entry is not None and entry[0] == agent_id and entry[1] in REPORTING_STATUSES
+
+    def invalidate(self, order_id):
+        self._cache.pop(order_id)
+
+
+class LocationCoalescer:
+    """Collects agent GPS pings and forwards only the latest per order.
+
+    Pings are validated, out-of-order or stale samples are dropped, and the
+    newest position for each order is held until the next flush, which
+    emits one delivery_location_update per watched order room.
+    """
+
+    def __init__(self, app=None):
+        self.flush_interval = 1.0
+        self.max_age = 30.0
+        self._pending = {}
+        self._last_seen = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.accepted = 0
+        self.dropped = 0
+        self.emitted = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.flush_interval = int(app.config.get('LOCATION_FLUSH_INTERVAL_MS', 1000)) / 1000.0
+        self.max_age = float(app.config.get('LOCATION_MAX_AGE_SECONDS', self.max_age))
+        order_assignments.configure(
+            int(app.config.get('ASSIGNMENT_CACHE_SIZE', 10000)),
+            int(app.config.get('ASSIGNMENT_CACHE_TTL_SECONDS', 30))
+        )
+        app.extensions['location_coalescer'] = self
+
+    def subscribe(self, callback):
+        """Call callback(order_id, timestamp, latitude, longitude, agent_id) for every accepted ping"""
+        self._listeners.append(callback)
+
+    def submit(self, order_id, latitude, longitude, timestamp=None, agent_id=None):
+        """Queue a ping; returns False if it was rejected"""
+        now = time.time()
+        coordinates = valid_coordinates(latitude, longitude)
+        sampled_at = parse_timestamp(timestamp, now)
+        if order_id is None or coordinates is None or sampled_at is None \
+                or sampled_at < now - self.max_age or sampled_at > now + 5:
+            self.dropped += 1
+            return False
+
+        with self._lock:
+            if sampled_at <= self._last_seen.get(order_id, 0):
+                self.dropped += 1
+                return False
+            self._last_seen[order_id] = sampled_at
+            self._pending[order_id] = (coordinates[0], coordinates[1], sampled_at, agent_id)
+            self.accepted += 1
+
+        for callback in self._listeners:
+            callback(order_id, sampled_at, coordinates[0], coordinates[1], agent_id)
+        return True
+
+    def forget(self, order_id):
+        with self._lock:
+            self._pending.pop(order_id, None)
+            self._last_seen.pop(order_id, None)
+
+    def flush(self):
+        """Emit the latest position for every order that moved since the last flush"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+
+        emitted = 0
+        for order_id, (latitude, longitude, sampled_at, agent_id) in batch.items():
+            room = f'order_{order_id}'
+            if not subscriptions.has_subscribers(room):
+                continue
+            socketio.emit('delivery_location_update', {
+                'order_id': order_id,
+                'agent_id': agent_id,
+                'latitude': latitude,
+                'longitude': longitude,
+                'timestamp': datetime.utcfromtimestamp(sampled_at).isoformat()
+            }, room=room)
+            emitted += 1
+        self.emitted += emitted
+        return emitted
+
+    def run(self, app):
+        """Background flush loop; start with socketio.start_background_task"""
+        while True:
+            socketio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                app.logger.exception('Failed to flush location updates')
+
+
+order_assignments = AssignmentLookup()
+location_coalescer = LocationCoalescer()
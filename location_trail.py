@@ -0,0 +1,184 @@
+import math
+import threading
+from array import array
+
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import InterfaceError, OperationalError, SQLAlchemyError
+
+from extensions import db, socketio
+from models.location_sample import LocationSample
+
+
+class TrailBuffer:
+    """Fixed-capacity ring buffer of (timestamp, lat, lon) held in typed arrays"""
+
+    __slots__ = ('capacity', 'times', 'lats', 'lons', 'start', 'size')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.lats = array('d', bytes(8 * capacity))
+        self.lons = array('d', bytes(8 * capacity))
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, timestamp, latitude, longitude):
+        index = (self.start + self.size) % self.capacity
+        self.times[index] = timestamp
+        self.lats[index] = latitude
+        self.lons[index] = longitude
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    @property
+    def last_timestamp(self):
+        if not self.size:
+            return None
+        return self.times[(self.start + self.size - 1) % self.capacity]
+
+    def samples(self, max_points=None):
+        """Samples oldest first, evenly thinned to max_points (always keeping the latest)"""
+        stride = 1
+        if max_points and self.size > max_points:
+            stride = -(-self.size // max_points)
+        positions = list(range(0, self.size, stride))
+        if self.size and positions[-1] != self.size - 1:
+            positions.append(self.size - 1)
+
+        result = []
+        for offset in positions:
+            index = (self.start + offset) % self.capacity
+            result.append((self.times[index], self.lats[index], self.lons[index]))
+        return result
+
+
+def _sample_row(order_id, timestamp, latitude, longitude):
+    """A location_sample row, or None if any value would not fit its column"""
+    if isinstance(order_id, bool) or not isinstance(order_id, int):
+        return None
+    try:
+        values = (float(timestamp), float(latitude), float(longitude))
+    except (TypeError, ValueError):
+        return None
+    if not all(math.isfinite(value) for value in values):
+        return None
+    return (order_id,) + values
+
+
+class TrailStore:
+    """Per-order in-memory trails with periodic bulk flush to location_sample.
+
+    Samples are checked before they are buffered. If a flush fails because
+    the database is unreachable the batch is kept for the next flush, up to
+    TRAIL_MAX_UNFLUSHED samples (oldest dropped first); any other failure
+    retries the batch row by row and logs and drops the rows that still fail.
+    """
+
+    def __init__(self, app=None):
+        self.capacity = 512
+        self.flush_interval = 15
+        self.max_unflushed = 50000
+        self._trails = {}
+        self._unflushed = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.capacity = int(app.config.get('TRAIL_BUFFER_SIZE', self.capacity))
+        self.flush_interval = int(app.config.get('TRAIL_FLUSH_INTERVAL_SECONDS', self.flush_interval))
+        self.max_unflushed = int(app.config.get('TRAIL_MAX_UNFLUSHED', self.max_unflushed))
+        app.extensions['trail_store'] = self
+
+    def record(self, order_id, timestamp, latitude, longitude):
+        """Buffer a sample; returns False if it was rejected"""
+        row = _sample_row(order_id, timestamp, latitude, longitude)
+        if row is None:
+            return False
+        with self._lock:
+            trail = self._trails.get(order_id)
+            if trail is None:
+                trail = self._trails[order_id] = TrailBuffer(self.capacity)
+            trail.append(row[1], row[2], row[3])
+            self._unflushed.append(row)
+            if len(self._unflushed) > self.max_unflushed:
+                del self._unflushed[:len(self._unflushed) - self.max_unflushed]
+        return True
+
+    def discard(self, order_id):
+        """Release the in-memory trail once an order is finished; flushed rows remain"""
+        with self._lock:
+            self._trails.pop(order_id, None)
+
+    def trail(self, order_id, max_points=None):
+        """Trail samples for an order, falling back to the table after a restart"""
+        with self._lock:
+            buffer = self._trails.get(order_id)
+            if buffer is not None:
+                return buffer.samples(max_points)
+
+        rows = db.session.query(LocationSample.recorded_at, LocationSample.latitude, LocationSample.longitude) \
+            .filter(LocationSample.order_id == order_id) \
+            .order_by(LocationSample.recorded_at.desc()).limit(self.capacity).all()
+        buffer = TrailBuffer(self.capacity)
+        for recorded_at, latitude, longitude in reversed(rows):
+            buffer.append(recorded_at, latitude, longitude)
+        return buffer.samples(max_points)
+
+    def flush(self):
+        """Bulk insert samples recorded since the last flush"""
+        with self._lock:
+            pending, self._unflushed = self._unflushed, []
+        if not pending:
+            return 0
+        rows = [{'order_id': order_id, 'recorded_at': timestamp, 'latitude': latitude, 'longitude': longitude}
+                for order_id, timestamp, latitude, longitude in pending]
+        try:
+            db.session.execute(insert(LocationSample), rows)
+            db.session.commit()
+            return len(rows)
+        except (OperationalError, InterfaceError):
+            # Database unreachable: keep the batch for the next flush, within the cap
+            db.session.rollback()
+            with self._lock:
+                self._unflushed[:0] = pending
+                if len(self._unflushed) > self.max_unflushed:
+                    del self._unflushed[:len(self._unflushed) - self.max_unflushed]
+            raise
+        except SQLAlchemyError:
+            db.session.rollback()
+        return self._insert_one_by_one(rows)
+
+    def _insert_one_by_one(self, rows):
+        """Isolate the rows that made a bulk insert fail; returns how many were written"""
+        written = 0
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(LocationSample).values(row))
+                written += 1
+            except SQLAlchemyError as exc:
+                current_app.logger.warning('Dropping location sample %r: %s', row, exc)
+        db.session.commit()
+        return written
+
+    def run(self, app):
+        """Background flush loop; start with socketio.start_background_task"""
+        while True:
+            socketio.sleep(self.flush_interval)
+            with app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    app.logger.exception('Failed to flush location trail')
+                finally:
+                    db.session.remove()
+
+
+trail_store = TrailStore()
@@ -0,0 +1,111 @@
+import threading
+from datetime import datetime, timezone
+
+from flask import render_template
+
+from caching import TTLCache
+from conditional import BOOT_TIME
+from models.restaurant import Restaurant
+from models.menu_item import MenuItem
+
+
+class MenuSnapshot:
+    """Serialized restaurant header and menu at one version"""
+
+    __slots__ = ('restaurant_id', 'version', 'restaurant', 'items', 'html')
+
+    def __init__(self, restaurant_id, version, restaurant, items, html=None):
+        self.restaurant_id = restaurant_id
+        self.version = version
+        self.restaurant = restaurant
+        self.items = items
+        self.html = html
+
+
+class MenuCache:
+    """Per-restaurant menu snapshots, bounded and versioned.
+
+    Every menu write calls invalidate(), which bumps the restaurant's
+    version and drops its snapshot, so a warm read never touches the
+    database and a stale snapshot is never served after a write.
+    """
+
+    def __init__(self, app=None):
+        self._snapshots = TTLCache(1024, 300)
+        self._versions = {}
+        self._modified = {}
+        self._lock = threading.Lock()
+        self.render_html = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._snapshots = TTLCache(
+            int(app.config.get('MENU_CACHE_SIZE', 1024)),
+            int(app.config.get('MENU_CACHE_TTL_SECONDS', 300))
+        )
+        self.render_html = bool(app.config.get('MENU_CACHE_HTML', False))
+        app.extensions['menu_cache'] = self
+
+    def version(self, restaurant_id):
+        return self._versions.get(restaurant_id, 0)
+
+    def last_modified(self, restaurant_id):
+        return self._modified.get(restaurant_id, BOOT_TIME)
+
+    def invalidate(self, restaurant_id):
+        with self._lock:
+            self._versions[restaurant_id] = self._versions.get(restaurant_id, 0) + 1
+            self._modified[restaurant_id] = datetime.now(timezone.utc).replace(microsecond=0)
+            self._snapshots.pop(restaurant_id)
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+
+    def get(self, restaurant_id):
+        """Menu snapshot for a restaurant, or None if it does not exist"""
+        snapshot = self._snapshots.get(restaurant_id)
+        if snapshot is not None:
+            return snapshot
+
+        version = self.version(restaurant_id)
+        restaurant = Restaurant.query.get(restaurant_id)
+        if restaurant is None:
+            return None
+        items = MenuItem.query.filter_by(restaurant_id=restaurant_id).order_by(MenuItem.id).all()
+
+        snapshot = MenuSnapshot(
+            restaurant_id,
+            version,
+            {
+                'id': restaurant.id,
+                'name': restaurant.name,
+                'address': restaurant.address,
+                'cuisine_type': restaurant.cuisine_type,
+                'is_active': restaurant.is_active,
+                'latitude': restaurant.latitude,
+                'longitude': restaurant.longitude
+            },
+            [
+                {
+                    'id': item.id,
+                    'name': item.name,
+                    'price': item.price,
+                    'description': item.description,
+                    'is_available': item.is_available
+                }
+                for item in items
+            ]
+        )
+        if self.render_html:
+            snapshot.html = render_template('_menu_items.html', menu_items=snapshot.items)
+
+        # Only publish if no write happened while we were loading
+        with self._lock:
+            if self.version(restaurant_id) == version:
+                self._snapshots.set(restaurant_id, snapshot)
+        return snapshot
+
+
+menu_cache = MenuCache()
@@ -0,0 +1,221 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# order_123 -> order_*; per-entity rooms would give every order its own time series
+_ROOM_ID = re.compile(r'\d+$')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, key, value):
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for key, (counts, total) in sorted(self._series.items()):
+            labels = _labels(self.labels, key)
+            prefix = labels + ',' if labels else ''
+            running = 0
+            for bound, count in zip(self.buckets, counts):
+                running += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {running}')
+            running += counts[-1]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {running}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {running}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series = {}
+
+    def inc(self, key, amount=1):
+        self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for key, value in sorted(self._series.items()):
+            lines.append(f'{self.name}{{{_labels(self.labels, key)}}} {value:g}')
+        return lines
+
+
+class Metrics:
+    """In-process request, query and socket metrics rendered in Prometheus text format.
+
+    Each observation is a couple of dict updates under one lock, cheap enough
+    to leave on in production. Endpoint labels come from the matched URL rule
+    and socket rooms are collapsed to their prefix, so series counts stay
+    bounded. Values are per worker process; scrape every worker.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.allowed_ips = ('127.0.0.1', '::1')
+        self._lock = threading.Lock()
+        self._sql_hooked = False
+        self.request_duration = Histogram(
+            'swiftserve_http_request_duration_seconds', 'Request latency by endpoint.',
+            ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.requests = Counter(
+            'swiftserve_http_requests_total', 'Requests by endpoint and status code.',
+            ('endpoint', 'method', 'status'))
+        self.request_queries = Histogram(
+            'swiftserve_db_queries_per_request', 'SQL statements executed per request.',
+            ('endpoint',), QUERY_COUNT_BUCKETS)
+        self.queries = Counter(
+            'swiftserve_db_queries_total', 'SQL statements by originating endpoint.', ('endpoint',))
+        self.query_seconds = Counter(
+            'swiftserve_db_query_seconds_total', 'Time spent in SQL by originating endpoint.', ('endpoint',))
+        self.socket_received = Counter(
+            'swiftserve_socket_events_received_total', 'Inbound socket events by name.', ('event',))
+        self.socket_duration = Histogram(
+            'swiftserve_socket_handler_duration_seconds', 'Socket handler latency by event.',
+            ('event',), LATENCY_BUCKETS)
+        self.socket_emitted = Counter(
+            'swiftserve_socket_events_emitted_total', 'Outbound socket events by name and room.',
+            ('event', 'room'))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('METRICS_ENABLED', self.enabled))
+        allowed = app.config.get('METRICS_ALLOWED_IPS', self.allowed_ips)
+        self.allowed_ips = tuple(ip.strip() for ip in allowed.split(',')) if isinstance(allowed, str) else tuple(allowed)
+        app.extensions['metrics'] = self
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if not self._sql_hooked:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._sql_hooked = True
+
+    # HTTP
+
+    def _before_request(self):
+        g._metrics_start = time.perf_counter()
+        g._metrics_queries = 0
+
+    def _after_request(self, response):
+        g._metrics_status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        # Recorded at teardown, which also runs when a view raises and after_request is skipped
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        status = g.pop('_metrics_status', None)
+        if exc is not None or status is None:
+            status = 500
+        endpoint = request.url_rule.endpoint if request.url_rule is not None else 'unmatched'
+        with self._lock:
+            self.request_duration.observe((endpoint, request.method), elapsed)
+            self.requests.inc((endpoint, request.method, status))
+            self.request_queries.observe((endpoint,), g.pop('_metrics_queries', 0))
+
+    # SQL
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_metrics_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('_metrics_started')
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        if has_request_context():
+            endpoint = request.url_rule.endpoint if request.url_rule is not None else 'unmatched'
+            if '_metrics_queries' in g:
+                g._metrics_queries += 1
+        else:
+            endpoint = 'background' if has_app_context() else 'none'
+        with self._lock:
+            self.queries.inc((endpoint,))
+            self.query_seconds.inc((endpoint,), elapsed)
+
+    # SocketIO
+
+    def instrument_socketio(self, socketio):
+        """Time every registered handler and count outbound emits; call after handlers are declared"""
+        if not self.enabled or socketio.server is None:
+            return
+        for namespace, handlers in socketio.server.handlers.items():
+            for name, handler in list(handlers.items()):
+                if getattr(handler, '_metrics_wrapped', False):
+                    continue
+                handlers[name] = self._timed_handler(name, handler)
+
+        emit = socketio.emit
+
+        def counted_emit(event, *args, **kwargs):
+            room = kwargs.get('to') or kwargs.get('room')
+            label = _ROOM_ID.sub('*', str(room)) if room is not None else 'broadcast'
+            with self._lock:
+                self.socket_emitted.inc((event, label))
+            return emit(event, *args, **kwargs)
+        socketio.emit = counted_emit
+
+    def _timed_handler(self, name, handler):
+        def timed(*args):
+            start = time.perf_counter()
+            try:
+                return handler(*args)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.socket_received.inc((name,))
+                    self.socket_duration.observe((name,), elapsed)
+        timed._metrics_wrapped = True
+        return timed
+
+    # Exposition
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for metric in (self.request_duration, self.requests, self.request_queries, self.queries,
+                           self.query_seconds, self.socket_received, self.socket_duration, self.socket_emitted):
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        if request.remote_addr not in self.allowed_ips:
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+metrics = Metrics()
@@ -0,0 +1,184 @@
+"""Versioned schema migrations and the index set the hot queries rely on.
+
+    flask --app app db-upgrade        apply pending migrations
+    flask --app app db-check-indexes  report hot queries without a usable index
+"""
+import sys
+from datetime import datetime
+
+import click
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, inspect
+from sqlalchemy.schema import CreateTable
+
+from extensions import db
+from models.user import User
+from models.restaurant import Restaurant
+from models.menu_item import MenuItem
+from models.order import Order
+from models.order_item import OrderItem
+from models.cart_item import CartItem
+from models.location_sample import LocationSample
+from models.order_rollup import OrderRollup
+from models.menu_item_rollup import MenuItemRollup
+from models.order_archive import OrderArchive
+from models.order_item_archive import OrderItemArchive
+from models.location_sample_archive import LocationSampleArchive
+from models.scheduler_lease import SchedulerLease
+import rollups
+
+_meta = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _meta,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+# (index, the query in app code it serves). Declared against the model tables,
+# but each list is created only by the migration that introduced it.
+HOT_INDEXES = [
+    (Index('ix_user_email', User.__table__.c.email),
+     'login/register: User by email'),
+    (Index('ix_restaurant_owner_id', Restaurant.__table__.c.owner_id),
+     'restaurant routes: Restaurant by owner_id'),
+    (Index('ix_menu_item_restaurant_id', MenuItem.__table__.c.restaurant_id),
+     'menus: MenuItem by restaurant_id'),
+    (Index('ix_order_restaurant_status_timestamp', Order.__table__.c.restaurant_id,
+           Order.__table__.c.status, Order.__table__.c.timestamp),
+     'restaurant_dashboard: active orders by restaurant and status, newest first'),
+    (Index('ix_order_restaurant_timestamp_id', Order.__table__.c.restaurant_id,
+           Order.__table__.c.timestamp, Order.__table__.c.id),
+     'restaurant_dashboard: keyset-paged order history'),
+    (Index('ix_order_status_agent', Order.__table__.c.status, Order.__table__.c.agent_id),
+     'dispatch: ready_for_pickup orders without an agent'),
+    (Index('ix_order_agent_status', Order.__table__.c.agent_id, Order.__table__.c.status),
+     'delivery_dashboard / dispatch load: orders by agent and status'),
+    (Index('ix_order_item_order_id', OrderItem.__table__.c.order_id),
+     'order deltas and item counts: OrderItem by order_id'),
+]
+
+SWEEPER_INDEXES = [
+    (Index('ix_order_status_timestamp', Order.__table__.c.status, Order.__table__.c.timestamp),
+     'sweeper: pending orders past the timeout, terminal orders past retention'),
+]
+
+# Every index db-check-indexes expects
+CHECKED_INDEXES = HOT_INDEXES + SWEEPER_INDEXES
+
+# The tables as they stood when migrations were introduced
+BASELINE_TABLES = [User, Restaurant, MenuItem, Order, OrderItem, CartItem, LocationSample]
+
+
+def _create_table(connection, model):
+    """Create a model's table and its declared indexes, leaving out indexes a migration list owns"""
+    table = model.__table__
+    connection.execute(CreateTable(table, if_not_exists=True))
+    owned_elsewhere = set(index.name for index, _ in CHECKED_INDEXES)
+    for index in table.indexes:
+        if index.name not in owned_elsewhere:
+            index.create(bind=connection, checkfirst=True)
+
+
+def _create_indexes(connection, indexes):
+    for index, _ in indexes:
+        index.create(bind=connection, checkfirst=True)
+
+
+def _create_tables(connection):
+    for model in BASELINE_TABLES:
+        _create_table(connection, model)
+
+
+def _create_hot_indexes(connection):
+    _create_indexes(connection, HOT_INDEXES)
+
+
+def _create_rollups(connection):
+    _create_table(connection, OrderRollup)
+    _create_table(connection, MenuItemRollup)
+    rollups.rebuild(connection)
+
+
+def _create_sweeper_tables(connection):
+    _create_table(connection, SchedulerLease)
+    _create_table(connection, OrderArchive)
+    _create_table(connection, OrderItemArchive)
+    _create_indexes(connection, SWEEPER_INDEXES)
+
+
+def _create_location_archive(connection):
+    _create_table(connection, LocationSampleArchive)
+
+
+# Append only; never renumber or edit an applied migration. A new table or index
+# gets its own step; a new index goes in a list like SWEEPER_INDEXES rather than
+# a model's __table_args__, so earlier steps keep building the same schema.
+MIGRATIONS = [
+    (1, 'baseline tables', _create_tables),
+    (2, 'indexes for hot dashboard, dispatch and menu queries', _create_hot_indexes),
+    (3, 'order and menu item rollups, backfilled from history', _create_rollups),
+    (4, 'order sweeper lease, order archive tables and status/timestamp index', _create_sweeper_tables),
+    (5, 'location sample archive table', _create_location_archive),
+]
+
+
+def applied_versions(connection):
+    _meta.create_all(bind=connection)
+    return set(row[0] for row in connection.execute(schema_migrations.select().with_only_columns(
+        schema_migrations.c.version)))
+
+
+def upgrade():
+    """Apply pending migrations in order, each in its own transaction; returns the versions applied"""
+    applied = []
+    with db.engine.begin() as connection:
+        done = applied_versions(connection)
+    for version, description, step in MIGRATIONS:
+        if version in done:
+            continue
+        with db.engine.begin() as connection:
+            step(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()))
+        applied.append(version)
+    return applied
+
+
+def missing_indexes():
+    """Hot queries whose columns are not the leading columns of any existing index"""
+    inspector = inspect(db.engine)
+    existing = {}
+    missing = []
+    for index, purpose in CHECKED_INDEXES:
+        table = index.table.name
+        if table not in existing:
+            if not inspector.has_table(table):
+                existing[table] = []
+            else:
+                existing[table] = [list(ix['column_names']) for ix in inspector.get_indexes(table)]
+                pk = inspector.get_pk_constraint(table).get('constrained_columns') or []
+                if pk:
+                    existing[table].append(list(pk))
+        wanted = [column.name for column in index.columns]
+        if not any(columns[:len(wanted)] == wanted for columns in existing[table]):
+            missing.append((index.name, table, wanted, purpose))
+    return missing
+
+
+def init_app(app):
+    @app.cli.command('db-upgrade')
+    def db_upgrade_command():
+        """Apply pending schema migrations."""
+        applied = upgrade()
+        click.echo(f'Applied migrations: {applied}' if applied else 'Schema is up to date.')
+
+    @app.cli.command('db-check-indexes')
+    def db_check_indexes_command():
+        """Report hot queries that have no usable index."""
+        missing = missing_indexes()
+        if not missing:
+            click.echo(f'All {len(CHECKED_INDEXES)} hot query indexes present.')
+            return
+        for name, table, columns, purpose in missing:
+            click.echo(f'MISSING {name} on {table}({", ".join(columns)}) -- {purpose}')
+        sys.exit(1)
@@ -0,0 +1,17 @@
+from datetime import datetime
+
+from extensions import db
+
+
+class CartItem(db.Model):
+    __tablename__ = 'cart_item'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    menu_item_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'menu_item_id', name='uq_cart_item_user_menu_item'),
+    )
@@ -0,0 +1,15 @@
+from extensions import db
+
+
+class LocationSample(db.Model):
+    __tablename__ = 'location_sample'
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, nullable=False)
+    recorded_at = db.Column(db.Float, nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_location_sample_order_recorded', 'order_id', 'recorded_at'),
+    )
@@ -0,0 +1,16 @@
+from extensions import db
+
+
+class LocationSampleArchive(db.Model):
+    """Delivery trail points of archived orders"""
+    __tablename__ = 'location_sample_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.Integer, nullable=False)
+    recorded_at = db.Column(db.Float, nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_location_sample_archive_order_recorded', 'order_id', 'recorded_at'),
+    )
@@ -0,0 +1,12 @@
+from extensions import db
+
+
+class MenuItem(db.Model):
+    __tablename__ = 'menu_item'
+
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    price = db.Column(db.Float, nullable=False)
+    is_available = db.Column(db.Boolean, default=True)
@@ -0,0 +1,19 @@
+from extensions import db
+
+
+class MenuItemRollup(db.Model):
+    """Quantity and revenue of one menu item ordered within an hour or day bucket"""
+    __tablename__ = 'menu_item_rollup'
+
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    period = db.Column(db.String(10), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    menu_item_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint('restaurant_id', 'period', 'bucket_start', 'menu_item_id',
+                            name='uq_menu_item_rollup_bucket'),
+    )
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from extensions import db
+
+
+class Order(db.Model):
+    __tablename__ = 'order'
+
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
+    agent_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    total_amount = db.Column(db.Float)
+    delivery_address = db.Column(db.Text)
+    special_instructions = db.Column(db.Text)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    restaurant = db.relationship('Restaurant')
+    customer = db.relationship('User', foreign_keys=[customer_id])
+    agent = db.relationship('User', foreign_keys=[agent_id])
+    order_items = db.relationship('OrderItem', lazy=True)
+
+    def get_status_display(self):
+        return (self.status or '').replace('_', ' ').title()
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from extensions import db
+
+
+class OrderArchive(db.Model):
+    """Terminal orders moved out of the hot order table after the retention window"""
+    __tablename__ = 'order_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    customer_id = db.Column(db.Integer, nullable=False)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    agent_id = db.Column(db.Integer)
+    status = db.Column(db.String(20), nullable=False)
+    total_amount = db.Column(db.Float)
+    delivery_address = db.Column(db.Text)
+    special_instructions = db.Column(db.Text)
+    timestamp = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_order_archive_restaurant_timestamp', 'restaurant_id', 'timestamp'),
+        db.Index('ix_order_archive_customer_timestamp', 'customer_id', 'timestamp'),
+    )
@@ -0,0 +1,14 @@
+from extensions import db
+
+
+class OrderItem(db.Model):
+    __tablename__ = 'order_item'
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    price_at_order = db.Column(db.Float)
+    special_instructions = db.Column(db.Text)
+
+    menu_item = db.relationship('MenuItem')
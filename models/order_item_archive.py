@@ -0,0 +1,13 @@
+from extensions import db
+
+
+class OrderItemArchive(db.Model):
+    """Line items of archived orders"""
+    __tablename__ = 'order_item_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.Integer, nullable=False, index=True)
+    menu_item_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    price_at_order = db.Column(db.Float)
+    special_instructions = db.Column(db.Text)
@@ -0,0 +1,23 @@
+from extensions import db
+
+
+class OrderRollup(db.Model):
+    """Orders that reached a status within one hour or day bucket, per restaurant.
+
+    status 'placed' counts new orders; every other status counts orders that
+    moved into it during the bucket. revenue is the summed total_amount of
+    those orders.
+    """
+    __tablename__ = 'order_rollup'
+
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    period = db.Column(db.String(10), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint('restaurant_id', 'period', 'bucket_start', 'status', name='uq_order_rollup_bucket'),
+    )
@@ -0,0 +1,14 @@
+from extensions import db
+
+
+class Restaurant(db.Model):
+    __tablename__ = 'restaurant'
+
+    id = db.Column(db.Integer, primary_key=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    address = db.Column(db.Text)
+    cuisine_type = db.Column(db.String(50))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    is_active = db.Column(db.Boolean, default=True)
@@ -0,0 +1,10 @@
+from extensions import db
+
+
+class SchedulerLease(db.Model):
+    """Named lease that lets exactly one worker run a periodic job at a time"""
+    __tablename__ = 'scheduler_lease'
+
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.Float, nullable=False)
@@ -0,0 +1,16 @@
+from flask_login import UserMixin
+
+from extensions import db
+
+
+class User(UserMixin, db.Model):
+    __tablename__ = 'user'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password = db.Column(db.String(255), nullable=False)
+    role = db.Column(db.String(20), nullable=False)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    is_available = db.Column(db.Boolean, default=False)
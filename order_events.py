@@ -0,0 +1,106 @@
+import threading
+from collections import deque
+
+from extensions import db, socketio
+from models.user import User
+from models.restaurant import Restaurant
+from models.menu_item import MenuItem
+from models.order_item import OrderItem
+from subscriptions import subscriptions
+
+
+def order_delta(order):
+    """Everything a dashboard needs to render an order row without reloading"""
+    customer_name, restaurant_name = db.session.query(User.name, Restaurant.name) \
+        .filter(User.id == order.customer_id, Restaurant.id == order.restaurant_id).first() or (None, None)
+    items = db.session.query(MenuItem.name, OrderItem.quantity, OrderItem.price_at_order) \
+        .join(MenuItem, MenuItem.id == OrderItem.menu_item_id) \
+        .filter(OrderItem.order_id == order.id).all()
+
+    return {
+        'id': order.id,
+        'status': order.status,
+        'status_display': (order.status or '').replace('_', ' ').title(),
+        'restaurant_id': order.restaurant_id,
+        'restaurant_name': restaurant_name,
+        'customer_id': order.customer_id,
+        'customer_name': customer_name,
+        'agent_id': order.agent_id,
+        'delivery_address': order.delivery_address,
+        'total_amount': order.total_amount,
+        'timestamp': order.timestamp.isoformat() if order.timestamp else None,
+        'item_count': len(items),
+        'items': [{'name': name, 'quantity': quantity, 'price': price} for name, quantity, price in items]
+    }
+
+
+class OrderFeed:
+    """Per-room sequence-numbered order deltas.
+
+    Each emit carries the next sequence number for its room and is kept in
+    a short log, so a dashboard that notices a gap can fetch just the
+    missed deltas instead of reloading the page. A room with no subscribers
+    still advances its sequence but drops its log, so a dashboard that was
+    away asks for a reload instead of missing the skipped delta.
+
+    Sequence numbers and the log are per process. With SOCKETIO_MESSAGE_QUEUE
+    set, several workers emit into the same room, so the feed is unsequenced:
+    messages carry seq None, nothing is logged, and a dashboard reloads after
+    a reconnect instead of asking for the deltas it missed.
+    """
+
+    def __init__(self, log_size=200):
+        self.log_size = log_size
+        self.sequenced = True
+        self._seq = {}
+        self._log = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.log_size = int(app.config.get('ORDER_FEED_LOG_SIZE', self.log_size))
+        self.sequenced = not app.config.get('SOCKETIO_MESSAGE_QUEUE')
+        app.extensions['order_feed'] = self
+
+    def current(self, room):
+        """Latest sequence number for a room, or None when the feed is unsequenced"""
+        if not self.sequenced:
+            return None
+        return self._seq.get(room, 0)
+
+    def publish(self, event, delta, rooms, **extra):
+        """delta may be the order_delta dict or a callable building it, called only if a room is watched"""
+        for room in rooms:
+            if not subscriptions.has_subscribers(room):
+                with self._lock:
+                    self._seq[room] = self._seq.get(room, 0) + 1
+                    self._log.pop(room, None)
+                continue
+            if callable(delta):
+                delta = delta()
+            if not self.sequenced:
+                socketio.emit(event, dict(extra, event=event, seq=None, order_id=delta['id'], order=delta), room=room)
+                continue
+            with self._lock:
+                seq = self._seq.get(room, 0) + 1
+                self._seq[room] = seq
+                message = dict(extra, event=event, seq=seq, order_id=delta['id'], order=delta)
+                self._log.setdefault(room, deque(maxlen=self.log_size)).append(message)
+            socketio.emit(event, message, room=room)
+
+    def since(self, room, seq):
+        """Deltas after seq, or None if they have already fallen out of the log"""
+        if not self.sequenced:
+            return None
+        with self._lock:
+            current = self._seq.get(room, 0)
+            log = list(self._log.get(room, ()))
+        if seq == current:
+            return []
+        if seq > current:
+            return None
+        if not log or log[0]['seq'] > seq + 1:
+            return None
+        return [message for message in log if message['seq'] > seq]
+
+
+order_feed = OrderFeed()
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from extensions import db
+from models.menu_item import MenuItem
+from models.order import Order
+from models.order_item import OrderItem
+import rollups
+
+
+class OrderPlacementError(Exception):
+    """A cart that cannot be turned into an order; status_code maps onto the HTTP response"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def price_cart(restaurant_id, cart):
+    """Resolve current prices for a {menu_item_id: quantity} cart in one query.
+
+    Returns ([(menu_item_id, quantity, unit_price)], total) or raises
+    OrderPlacementError if any item is unknown, unavailable or belongs to
+    another restaurant.
+    """
+    rows = db.session.query(MenuItem.id, MenuItem.restaurant_id, MenuItem.price, MenuItem.is_available) \
+        .filter(MenuItem.id.in_(list(cart))).all()
+    by_id = dict((row[0], row) for row in rows)
+
+    lines = []
+    total = 0.0
+    for item_id, quantity in cart.items():
+        row = by_id.get(item_id)
+        if row is None or row[1] != restaurant_id or not row[3]:
+            raise OrderPlacementError('Cart contains items that are unavailable from this restaurant')
+        lines.append((item_id, quantity, row[2]))
+        total += row[2] * quantity
+    return lines, round(total, 2)
+
+
+def create_order(customer_id, restaurant_id, cart, delivery_address=None, special_instructions=None):
+    """Insert an order and all of its line items in one transaction"""
+    if not cart:
+        raise OrderPlacementError('Cart is empty')
+
+    lines, total = price_cart(restaurant_id, cart)
+    try:
+        order = Order(
+            customer_id=customer_id,
+            restaurant_id=restaurant_id,
+            status='pending',
+            total_amount=total,
+            delivery_address=delivery_address,
+            special_instructions=special_instructions,
+            timestamp=datetime.utcnow()
+        )
+        db.session.add(order)
+        db.session.flush()
+
+        db.session.execute(insert(OrderItem), [
+            {'order_id': order.id, 'menu_item_id': item_id, 'quantity': quantity, 'price_at_order': price}
+            for item_id, quantity, price in lines
+        ])
+        rollups.record_placed(order, lines)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return order
@@ -0,0 +1,90 @@
+from extensions import db
+from models.order import Order
+import rollups
+
+# Allowed status changes, keyed by current status
+TRANSITIONS = {
+    'pending': ('accepted', 'cancelled'),
+    'accepted': ('preparing', 'cancelled'),
+    'preparing': ('ready_for_pickup', 'cancelled'),
+    'ready_for_pickup': ('picked_up', 'cancelled'),
+    'picked_up': ('in_transit', 'delivered'),
+    'in_transit': ('delivered',),
+    'delivered': (),
+    'cancelled': (),
+}
+
+# Which role may move an order into each status
+ROLE_TARGETS = {
+    'customer': ('cancelled',),
+    'restaurant': ('accepted', 'preparing', 'ready_for_pickup', 'cancelled'),
+    'delivery_agent': ('picked_up', 'in_transit', 'delivered'),
+}
+
+TERMINAL_STATUSES = ('delivered', 'cancelled')
+
+
+class TransitionError(Exception):
+    """A status change that was refused; status_code maps onto the HTTP response"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def can_transition(current, new_status):
+    return new_status in TRANSITIONS.get(current, ())
+
+
+def _authorize(order, new_status, user):
+    if new_status not in ROLE_TARGETS.get(user.role, ()):
+        raise TransitionError('Unauthorized', 403)
+    if user.role == 'customer' and order.customer_id != user.id:
+        raise TransitionError('Unauthorized', 403)
+    if user.role == 'restaurant' and order.restaurant.owner_id != user.id:
+        raise TransitionError('Unauthorized', 403)
+    if user.role == 'delivery_agent' and order.agent_id not in (None, user.id):
+        raise TransitionError('Order already claimed by another agent', 409)
+    if user.role == 'delivery_agent' and order.agent_id is None and new_status != 'picked_up':
+        raise TransitionError('Unauthorized', 403)
+
+
+def transition(order_id, new_status, user):
+    """Move an order to new_status with a single compare-and-set UPDATE.
+
+    The row is only written if its status (and, for a pickup, its unset
+    agent) still match what was read, so two agents racing for the same
+    order cannot both win. Returns the refreshed order or raises
+    TransitionError.
+    """
+    if new_status not in TRANSITIONS:
+        raise TransitionError('Unknown status', 400)
+
+    order = db.session.get(Order, order_id)
+    if order is None:
+        raise TransitionError('Order not found', 404)
+
+    _authorize(order, new_status, user)
+
+    current = order.status
+    if not can_transition(current, new_status):
+        raise TransitionError(f'Cannot change order from {current} to {new_status}', 409)
+
+    values = {Order.status: new_status}
+    query = Order.query.filter(Order.id == order.id, Order.status == current)
+    if user.role == 'delivery_agent':
+        if order.agent_id is None:
+            values[Order.agent_id] = user.id
+            query = query.filter(Order.agent_id.is_(None))
+        else:
+            query = query.filter(Order.agent_id == user.id)
+
+    updated = query.update(values, synchronize_session=False)
+    if updated:
+        rollups.record_transition(order, new_status)
+    db.session.commit()
+    if not updated:
+        raise TransitionError('Order was updated by someone else', 409)
+
+    db.session.refresh(order)
+    return order
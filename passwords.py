@@ -0,0 +1,68 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    from eventlet import patcher, tpool
+except ImportError:
+    patcher = tpool = None
+
+
+class PasswordHasher:
+    """Runs the password KDF off the event loop with bounded concurrency.
+
+    Under eventlet the work goes to eventlet's native thread pool so other
+    greenlets (and every open socket) keep running while a hash computes;
+    otherwise a small ThreadPoolExecutor is used. At most `concurrency`
+    hashes run at once, so a login spike queues instead of starving the CPU.
+    """
+
+    def __init__(self, app=None):
+        self.method = 'pbkdf2:sha256:600000'
+        self.salt_length = 16
+        self.concurrency = 4
+        self._canonical_method = None
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.salt_length = int(app.config.get('PASSWORD_SALT_LENGTH', self.salt_length))
+        self.concurrency = int(app.config.get('PASSWORD_HASH_CONCURRENCY', self.concurrency))
+        self._canonical_method = None
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._executor = None
+        app.extensions['password_hasher'] = self
+
+    def _offload(self, func, *args):
+        with self._slots:
+            if tpool is not None and patcher.is_monkey_patched('thread'):
+                return tpool.execute(func, *args)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                    thread_name_prefix='password-hash')
+            return self._executor.submit(func, *args).result()
+
+    @property
+    def canonical_method(self):
+        # werkzeug expands shorthands like 'pbkdf2' into the full parameter string it stores
+        if self._canonical_method is None:
+            self._canonical_method = generate_password_hash('', self.method, 1).split('$', 1)[0]
+        return self._canonical_method
+
+    def hash(self, password):
+        return self._offload(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, stored_hash, password):
+        if not stored_hash:
+            return False
+        return self._offload(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        return stored_hash.split('$', 1)[0] != self.canonical_method
+
+
+password_hasher = PasswordHasher()
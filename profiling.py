@@ -0,0 +1,246 @@
+import json
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask import g, jsonify, request, Response
+from flask_login import current_user, login_required
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+MAX_STACK_DEPTH = 64
+MAX_SQL_STATEMENTS = 500
+
+
+def _folded(frame):
+    """One stack in collapsed flame-graph form: outermost;...;innermost"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+
+class RequestProfiler:
+    """Opt-in stack-sampling profiler for a fraction of requests and for slow ones.
+
+    A request is watched when it is sampled (PROFILE_SAMPLE_RATE) or when a
+    slow threshold (PROFILE_SLOW_MS) is set. While any request is watched a
+    CPU-time interval timer (SIGPROF) fires every PROFILE_INTERVAL_MS and the
+    handler records the watched requests' stacks; the timer is disarmed
+    whenever nothing is watched. Watched requests also record their SQL.
+    A profile is written if the request was sampled or exceeded the
+    threshold, as JSON in PROFILE_DIR, keeping the newest PROFILE_MAX_FILES.
+    With profiling disabled no hooks are installed at all.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.slow_ms = 0
+        self.interval = 0.005
+        self.directory = 'profiles'
+        self.max_files = 200
+        self.admin_emails = set()
+        self._active = {}
+        self._lock = threading.Lock()
+        self._timer_armed = False
+        self._can_sample_stacks = False
+        self._sql_hooked = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('PROFILE_ENABLED', self.enabled))
+        self.sample_rate = float(app.config.get('PROFILE_SAMPLE_RATE', self.sample_rate))
+        self.slow_ms = int(app.config.get('PROFILE_SLOW_MS', self.slow_ms))
+        self.interval = int(app.config.get('PROFILE_INTERVAL_MS', self.interval * 1000)) / 1000.0
+        self.directory = app.config.get('PROFILE_DIR', self.directory)
+        self.max_files = int(app.config.get('PROFILE_MAX_FILES', self.max_files))
+        emails = app.config.get('PROFILE_ADMIN_EMAILS', '')
+        self.admin_emails = set(e.strip().lower() for e in emails.split(',') if e.strip()) \
+            if isinstance(emails, str) else set(e.lower() for e in emails)
+        app.extensions['profiler'] = self
+
+        app.add_url_rule('/admin/profiles', 'profile_index', login_required(self.index_view))
+        app.add_url_rule('/admin/profiles/<name>', 'profile_detail', login_required(self.detail_view))
+
+        if not self.enabled or (self.sample_rate <= 0 and self.slow_ms <= 0):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # Signal handlers can only be installed from the main thread, and SIGPROF is POSIX-only
+        if hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGPROF, self._on_sigprof)
+            self._can_sample_stacks = True
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if not self._sql_hooked:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._sql_hooked = True
+
+    # Sampling
+
+    def _arm(self):
+        if self._can_sample_stacks and not self._timer_armed:
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+            self._timer_armed = True
+
+    def _disarm(self):
+        if self._timer_armed:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            self._timer_armed = False
+
+    def _on_sigprof(self, signum, frame):
+        active = list(self._active.items())
+        if not active:
+            return
+        # Threaded servers: look each request's thread up. Eventlet: requests are greenlets on
+        # this thread, so only the one currently running (the interrupted frame) can be sampled.
+        frames = sys._current_frames()
+        current = threading.get_ident()
+        for ident, profile in active:
+            target = frames.get(ident)
+            if target is None and ident == current:
+                target = frame
+            if target is not None:
+                stacks = profile['stacks']
+                key = _folded(target)
+                stacks[key] = stacks.get(key, 0) + 1
+
+    # Request hooks
+
+    def _before_request(self):
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and self.slow_ms <= 0:
+            return
+        profile = {'sampled': sampled, 'started': time.perf_counter(), 'stacks': {}, 'sql': [], 'status': None}
+        g._profile = profile
+        with self._lock:
+            self._active[threading.get_ident()] = profile
+            self._arm()
+
+    def _after_request(self, response):
+        profile = g.get('_profile')
+        if profile is not None:
+            profile['status'] = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+            if not self._active:
+                self._disarm()
+        duration_ms = (time.perf_counter() - profile['started']) * 1000
+        slow = self.slow_ms > 0 and duration_ms >= self.slow_ms
+        if not (profile['sampled'] or slow):
+            return
+        try:
+            self._write(profile, duration_ms, 'slow' if slow else 'sampled', exc)
+        except OSError:
+            pass
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if g and '_profile' in g:
+            conn.info.setdefault('_profile_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not g or '_profile' not in g:
+            return
+        started = conn.info.get('_profile_started')
+        if not started:
+            return
+        elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+        sql = g._profile['sql']
+        if len(sql) < MAX_SQL_STATEMENTS:
+            sql.append({'statement': statement, 'duration_ms': round(elapsed_ms, 3),
+                        'executemany': executemany})
+
+    # Storage
+
+    def _write(self, profile, duration_ms, reason, exc):
+        now = datetime.utcnow()
+        endpoint = request.url_rule.endpoint if request.url_rule is not None else 'unmatched'
+        name = f"{now.strftime('%Y%m%dT%H%M%S%f')}-{endpoint}"
+        payload = {
+            'name': name,
+            'recorded_at': now.isoformat(),
+            'reason': reason,
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': profile['status'] if exc is None else 500,
+            'duration_ms': round(duration_ms, 3),
+            'interval_ms': self.interval * 1000,
+            'samples': sum(profile['stacks'].values()),
+            'sql_count': len(profile['sql']),
+            'sql_ms': round(sum(q['duration_ms'] for q in profile['sql']), 3),
+            'sql': profile['sql'],
+            'stacks': profile['stacks']
+        }
+        with open(os.path.join(self.directory, name + '.json'), 'w') as handle:
+            json.dump(payload, handle)
+        self._rotate()
+
+    def _rotate(self):
+        files = sorted(f for f in os.listdir(self.directory) if f.endswith('.json'))
+        for stale in files[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, stale))
+            except OSError:
+                pass
+
+    def _load(self, name):
+        if os.path.basename(name) != name:
+            return None
+        try:
+            with open(os.path.join(self.directory, name + '.json')) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    # Admin views
+
+    def _is_admin(self):
+        return current_user.email.lower() in self.admin_emails
+
+    def index_view(self):
+        if not self._is_admin():
+            return jsonify({'error': 'Unauthorized'}), 403
+        entries = []
+        if os.path.isdir(self.directory):
+            for filename in sorted(os.listdir(self.directory), reverse=True):
+                if not filename.endswith('.json'):
+                    continue
+                profile = self._load(filename[:-5])
+                if profile is None:
+                    continue
+                entries.append({key: profile.get(key) for key in (
+                    'name', 'recorded_at', 'reason', 'endpoint', 'method', 'path', 'status',
+                    'duration_ms', 'samples', 'sql_count', 'sql_ms')})
+        return jsonify({'enabled': self.enabled, 'profiles': entries})
+
+    def detail_view(self, name):
+        """Full profile as JSON, or ?format=folded for flamegraph.pl / speedscope"""
+        if not self._is_admin():
+            return jsonify({'error': 'Unauthorized'}), 403
+        profile = self._load(name)
+        if profile is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        if request.args.get('format') == 'folded':
+            lines = [f'{stack} {count}' for stack, count in sorted(profile['stacks'].items())]
+            return Response('\n'.join(lines) + '\n', mimetype='text/plain')
+        return jsonify(profile)
+
+
+profiler = RequestProfiler()
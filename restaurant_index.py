@@ -0,0 +1,88 @@
+import math
+import threading
+
+from extensions import db
+from geo import GridIndex
+from models.restaurant import Restaurant
+
+
+class NearbyPage:
+    """One page of restaurants ordered by distance from the customer"""
+
+    def __init__(self, items, distances, page, per_page, total):
+        self.items = items
+        self.distances = distances
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def pages(self):
+        return max(1, int(math.ceil(self.total / float(self.per_page))))
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+
+class RestaurantLocator:
+    """Grid index over open restaurants, loaded once and kept up to date by
+    the routes that create, edit or open/close a restaurant."""
+
+    def __init__(self, cell_size_km=2.0):
+        self._index = GridIndex(cell_size_km)
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self.version = 0
+
+    def ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            rows = db.session.query(Restaurant.id, Restaurant.latitude, Restaurant.longitude) \
+                .filter(Restaurant.is_active.is_(True)).all()
+            for restaurant_id, latitude, longitude in rows:
+                self._index.upsert(restaurant_id, latitude, longitude)
+            self._loaded = True
+
+    def update(self, restaurant):
+        """Reflect a created or edited restaurant in the index"""
+        if not self._loaded:
+            return
+        self.version += 1
+        if restaurant.is_active:
+            self._index.upsert(restaurant.id, restaurant.latitude, restaurant.longitude)
+        else:
+            self._index.remove(restaurant.id)
+
+    def remove(self, restaurant_id):
+        self.version += 1
+        self._index.remove(restaurant_id)
+
+    def reset(self):
+        self.version += 1
+        self._index.clear()
+        self._loaded = False
+
+    def nearby(self, latitude, longitude, radius_km, page=1, per_page=12):
+        self.ensure_loaded()
+        hits = self._index.within(latitude, longitude, radius_km)
+        page = max(1, page)
+        window = hits[(page - 1) * per_page:page * per_page]
+        distances = dict((restaurant_id, distance) for distance, restaurant_id in window)
+
+        items = []
+        if distances:
+            by_id = dict((r.id, r) for r in Restaurant.query.filter(Restaurant.id.in_(list(distances))).all())
+            items = [by_id[restaurant_id] for _, restaurant_id in window if restaurant_id in by_id]
+
+        return NearbyPage(items, distances, page, per_page, len(hits))
+
+
+restaurant_locator = RestaurantLocator()
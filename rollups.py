@@ -0,0 +1,218 @@
+"""Per-restaurant hourly and daily order aggregates, maintained incrementally.
+
+Placing an order and every status change add to the current hour and day
+buckets in the same transaction as the order write, so dashboards and
+reports read a few small rows instead of scanning order history.
+"""
+from datetime import datetime, timedelta, timezone
+
+import click
+from sqlalchemy import String, delete, func, insert, literal, select, update
+
+from extensions import db
+from models.menu_item import MenuItem
+from models.order import Order
+from models.order_item import OrderItem
+from models.order_rollup import OrderRollup
+from models.menu_item_rollup import MenuItemRollup
+
+PERIODS = ('hour', 'day')
+PERIOD_STEP = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+MAX_BUCKETS = 1000
+
+
+def bucket_start(moment, period):
+    if period == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _upsert_insert():
+    """The dialect's INSERT ... ON CONFLICT construct, or None if it has none"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def _increment(model, keys, counters, rows):
+    """Add each row's counter values onto the row with the same keys, creating it if needed.
+
+    rows must not repeat a key; callers merge duplicates first.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    dialect_insert = _upsert_insert()
+    if dialect_insert is not None:
+        statement = dialect_insert(model).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c[key] for key in keys],
+            set_={name: table.c[name] + statement.excluded[name] for name in counters}
+        )
+        db.session.execute(statement)
+        return
+    for row in rows:
+        updated = db.session.execute(
+            update(model)
+            .where(*[table.c[key] == row[key] for key in keys])
+            .values({name: table.c[name] + row[name] for name in counters})
+        ).rowcount
+        if not updated:
+            db.session.execute(insert(model).values(row))
+
+
+def _order_rows(restaurant_id, status, amount, moment):
+    return [{'restaurant_id': restaurant_id, 'period': period, 'bucket_start': bucket_start(moment, period),
+             'status': status, 'order_count': 1, 'revenue': amount or 0.0} for period in PERIODS]
+
+
+def record_placed(order, lines):
+    """Count a new order and its line items; call before the placing transaction commits"""
+    moment = order.timestamp or datetime.utcnow()
+    _increment(OrderRollup, ('restaurant_id', 'period', 'bucket_start', 'status'), ('order_count', 'revenue'),
+               _order_rows(order.restaurant_id, 'placed', order.total_amount, moment))
+
+    merged = {}
+    for menu_item_id, quantity, price in lines:
+        quantity_sum, revenue = merged.get(menu_item_id, (0, 0.0))
+        merged[menu_item_id] = (quantity_sum + quantity, revenue + price * quantity)
+    rows = [{'restaurant_id': order.restaurant_id, 'period': period, 'bucket_start': bucket_start(moment, period),
+             'menu_item_id': menu_item_id, 'quantity': quantity, 'revenue': round(revenue, 2)}
+            for period in PERIODS for menu_item_id, (quantity, revenue) in merged.items()]
+    _increment(MenuItemRollup, ('restaurant_id', 'period', 'bucket_start', 'menu_item_id'),
+               ('quantity', 'revenue'), rows)
+
+
+def record_transition(order, new_status, moment=None):
+    """Count an order reaching new_status; call before the status change commits"""
+    _increment(OrderRollup, ('restaurant_id', 'period', 'bucket_start', 'status'), ('order_count', 'revenue'),
+               _order_rows(order.restaurant_id, new_status, order.total_amount, moment or datetime.utcnow()))
+
+
+# Queries
+
+def totals(restaurant_id):
+    """All-time {status: order_count}, read from the daily buckets"""
+    rows = db.session.query(OrderRollup.status, func.sum(OrderRollup.order_count)) \
+        .filter(OrderRollup.restaurant_id == restaurant_id, OrderRollup.period == 'day') \
+        .group_by(OrderRollup.status).all()
+    return dict((status, int(count or 0)) for status, count in rows)
+
+
+def order_series(restaurant_id, period, start, end):
+    """Buckets in [start, end) as [{'bucket_start', 'orders': {status: n}, 'revenue': {status: amount}}]"""
+    rows = db.session.query(OrderRollup.bucket_start, OrderRollup.status, OrderRollup.order_count,
+                            OrderRollup.revenue) \
+        .filter(OrderRollup.restaurant_id == restaurant_id, OrderRollup.period == period,
+                OrderRollup.bucket_start >= start, OrderRollup.bucket_start < end) \
+        .order_by(OrderRollup.bucket_start).all()
+    buckets = {}
+    for moment, status, count, revenue in rows:
+        bucket = buckets.setdefault(moment, {'bucket_start': moment.isoformat(), 'orders': {}, 'revenue': {}})
+        bucket['orders'][status] = count
+        bucket['revenue'][status] = round(revenue, 2)
+    return list(buckets.values())
+
+
+def top_items(restaurant_id, period, start, end, limit=10):
+    """Best-selling menu items by quantity in [start, end)"""
+    quantity = func.sum(MenuItemRollup.quantity).label('quantity')
+    rows = db.session.query(MenuItemRollup.menu_item_id, MenuItem.name, quantity, func.sum(MenuItemRollup.revenue)) \
+        .outerjoin(MenuItem, MenuItem.id == MenuItemRollup.menu_item_id) \
+        .filter(MenuItemRollup.restaurant_id == restaurant_id, MenuItemRollup.period == period,
+                MenuItemRollup.bucket_start >= start, MenuItemRollup.bucket_start < end) \
+        .group_by(MenuItemRollup.menu_item_id, MenuItem.name) \
+        .order_by(quantity.desc()).limit(limit).all()
+    return [{'menu_item_id': item_id, 'name': name, 'quantity': int(qty or 0), 'revenue': round(revenue or 0, 2)}
+            for item_id, name, qty, revenue in rows]
+
+
+def _parse_moment(value):
+    """ISO-8601 string as a naive UTC datetime, the form buckets are stored in"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def parse_range(period, start, end, now=None):
+    """Validate a requested range; returns (start, end) bucket-aligned or raises ValueError"""
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    now = now or datetime.utcnow()
+    step = PERIOD_STEP[period]
+    end = _parse_moment(end) if end else bucket_start(now, period) + step
+    start = _parse_moment(start) if start else end - step * (48 if period == 'hour' else 30)
+    start, end = bucket_start(start, period), bucket_start(end, period)
+    if end <= start:
+        raise ValueError('end must be after start')
+    if (end - start) / step > MAX_BUCKETS:
+        raise ValueError(f'Range spans more than {MAX_BUCKETS} {period} buckets')
+    return start, end
+
+
+# Backfill
+
+def _bucket_expression(column, period, dialect):
+    """SQL for bucket_start(column, period), rendered the way DateTime values are stored"""
+    if dialect == 'sqlite':
+        # SQLAlchemy stores SQLite datetimes as text with microseconds; match it so upserts find the row
+        fmt = '%Y-%m-%d %H:00:00.000000' if period == 'hour' else '%Y-%m-%d 00:00:00.000000'
+        return func.strftime(fmt, column)
+    return func.date_trunc(period, column)
+
+
+def rebuild(connection, restaurant_id=None):
+    """Recompute rollups from order history with one GROUP BY insert per period and kind.
+
+    Each order counts as 'placed' and under its current status, both in the
+    bucket of its order timestamp; when intermediate steps happened is not
+    recorded, so only incremental updates carry exact transition times.
+    """
+    scope = [] if restaurant_id is None else [OrderRollup.restaurant_id == restaurant_id]
+    item_scope = [] if restaurant_id is None else [MenuItemRollup.restaurant_id == restaurant_id]
+    connection.execute(delete(OrderRollup).where(*scope))
+    connection.execute(delete(MenuItemRollup).where(*item_scope))
+
+    dialect = connection.dialect.name
+    order_filter = [Order.timestamp.isnot(None)]
+    if restaurant_id is not None:
+        order_filter.append(Order.restaurant_id == restaurant_id)
+    order_columns = ['restaurant_id', 'period', 'bucket_start', 'status', 'order_count', 'revenue']
+    item_columns = ['restaurant_id', 'period', 'bucket_start', 'menu_item_id', 'quantity', 'revenue']
+    order_rows = item_rows = 0
+
+    for period in PERIODS:
+        bucket = _bucket_expression(Order.timestamp, period, dialect)
+        # 'placed' for every order, then each order's current status unless it is still pending
+        for status, status_filter, group in ((literal('placed', String), [], []),
+                                             (Order.status, [Order.status != 'pending'], [Order.status])):
+            query = select(Order.restaurant_id, literal(period, String), bucket, status,
+                           func.count(Order.id), func.coalesce(func.sum(Order.total_amount), 0.0)) \
+                .where(*order_filter, *status_filter) \
+                .group_by(Order.restaurant_id, bucket, *group)
+            order_rows += connection.execute(insert(OrderRollup).from_select(order_columns, query)).rowcount
+
+        query = select(Order.restaurant_id, literal(period, String), bucket, OrderItem.menu_item_id,
+                       func.coalesce(func.sum(OrderItem.quantity), 0),
+                       func.coalesce(func.sum(OrderItem.price_at_order * OrderItem.quantity), 0.0)) \
+            .join(Order, Order.id == OrderItem.order_id) \
+            .where(*order_filter) \
+            .group_by(Order.restaurant_id, bucket, OrderItem.menu_item_id)
+        item_rows += connection.execute(insert(MenuItemRollup).from_select(item_columns, query)).rowcount
+    return order_rows, item_rows
+
+
+def init_app(app):
+    @app.cli.command('rollups-rebuild')
+    @click.option('--restaurant-id', type=int, default=None, help='Only rebuild one restaurant.')
+    def rollups_rebuild_command(restaurant_id):
+        """Recompute order rollups from order history."""
+        with db.engine.begin() as connection:
+            order_rows, item_rows = rebuild(connection, restaurant_id)
+        click.echo(f'Wrote {order_rows} order and {item_rows} menu item rollup rows.')
@@ -0,0 +1,49 @@
+import queue
+import threading
+
+import socketio as socketio_lib
+
+
+class LocalPubSubManager(socketio_lib.PubSubManager):
+    """In-process stand-in for a message queue.
+
+    Every manager created on the same channel shares one bus, so several
+    SocketIO servers inside one process (e.g. in tests) exchange room
+    emits exactly as separate workers would through Redis.
+    """
+
+    name = 'local'
+    _buses = {}
+    _buses_lock = threading.Lock()
+
+    def __init__(self, url='local://', channel='flask-socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._inbox = queue.Queue()
+        with self._buses_lock:
+            self._buses.setdefault(channel, []).append(self._inbox)
+
+    def _publish(self, data):
+        with self._buses_lock:
+            inboxes = list(self._buses.get(self.channel, ()))
+        for inbox in inboxes:
+            inbox.put(data)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+
+def message_queue_options(app):
+    """Keyword arguments for socketio.init_app selecting the configured message queue.
+
+    SOCKETIO_MESSAGE_QUEUE may be any URL Flask-SocketIO understands
+    (redis://, amqp://, kafka://, zmq+tcp://) or local:// for the in-process bus.
+    Left unset, the server runs as a single worker with no queue.
+    """
+    url = app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    channel = app.config.get('SOCKETIO_CHANNEL', 'swiftserve')
+    if not url:
+        return {}
+    if url.startswith('local://'):
+        return {'client_manager': LocalPubSubManager(url, channel=channel)}
+    return {'message_queue': url, 'channel': channel}
@@ -0,0 +1,54 @@
+import threading
+
+
+class SubscriptionRegistry:
+    """Which socket is in which room, and how many sockets each room has.
+
+    Join handlers record a room here after authorizing it; emitters ask
+    has_subscribers() first so an update for a room nobody watches is
+    never built or serialized. Only rooms with at least one socket are
+    kept, so memory follows live viewers rather than orders.
+
+    Counts are per worker. With SOCKETIO_MESSAGE_QUEUE set the viewers of
+    a room may be connected to another worker, so nothing is skipped.
+    """
+
+    def __init__(self, app=None):
+        self.skip_empty = True
+        self._counts = {}
+        self._rooms_by_sid = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.skip_empty = bool(app.config.get('SOCKET_SKIP_EMPTY_ROOMS', self.skip_empty)) \
+            and not app.config.get('SOCKETIO_MESSAGE_QUEUE')
+        app.extensions['subscriptions'] = self
+
+    def join(self, sid, room):
+        with self._lock:
+            rooms = self._rooms_by_sid.setdefault(sid, set())
+            if room in rooms:
+                return
+            rooms.add(room)
+            self._counts[room] = self._counts.get(room, 0) + 1
+
+    def disconnect(self, sid):
+        with self._lock:
+            for room in self._rooms_by_sid.pop(sid, ()):
+                self._release(room)
+
+    def _release(self, room):
+        remaining = self._counts.get(room, 0) - 1
+        if remaining > 0:
+            self._counts[room] = remaining
+        else:
+            self._counts.pop(room, None)
+
+    def has_subscribers(self, room):
+        """False only when skipping is enabled and no local socket is in the room"""
+        return not self.skip_empty or room in self._counts
+
+
+subscriptions = SubscriptionRegistry()
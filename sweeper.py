@@ -0,0 +1,217 @@
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from caching import TTLCache
+from extensions import db, socketio
+from models.order import Order
+from models.order_item import OrderItem
+from models.order_archive import OrderArchive
+from models.order_item_archive import OrderItemArchive
+from models.location_sample import LocationSample
+from models.location_sample_archive import LocationSampleArchive
+from models.scheduler_lease import SchedulerLease
+import rollups
+from subscriptions import subscriptions
+
+ESCALATE_STATUSES = ('accepted', 'preparing', 'ready_for_pickup')
+ARCHIVE_STATUSES = ('delivered', 'cancelled')
+LEASE_NAME = 'order_sweeper'
+
+
+def _archive_columns(source, target):
+    """Columns to copy from source into its archive table.
+
+    Raises if the archive is missing a source column or has a required
+    column the copy cannot fill, so schema drift stops the sweep instead of
+    silently archiving partial rows.
+    """
+    source_table, target_table = source.__table__, target.__table__
+    missing = [column.name for column in source_table.columns if column.name not in target_table.columns]
+    unfilled = [column.name for column in target_table.columns
+                if column.name not in source_table.columns and not column.nullable and column.default is None]
+    if missing or unfilled:
+        raise RuntimeError(f'{target_table.name} does not match {source_table.name}: '
+                           f'missing {missing or "nothing"}, cannot fill {unfilled or "nothing"}')
+    return list(source_table.columns)
+
+
+class OrderSweeper:
+    """Expires abandoned orders, flags stuck ones and archives old history.
+
+    Runs on every worker, but each pass first takes a lease row in the
+    database, so only one worker sweeps at a time and another takes over
+    within SWEEP_LEASE_SECONDS if the leader dies. Work is done in
+    fixed-size batches over the (status, timestamp) index, one
+    transaction per batch.
+    """
+
+    def __init__(self, app=None):
+        self.timeout = timedelta(minutes=30)
+        self.escalate_after = timedelta(minutes=60)
+        self.archive_after = timedelta(days=90)
+        self.interval = 60
+        self.batch_size = 500
+        self.lease_seconds = 180
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._acknowledged = TTLCache(10000, self.escalate_after.total_seconds())
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.timeout = timedelta(minutes=int(app.config.get('ORDER_TIMEOUT_MINUTES', 30)))
+        self.escalate_after = timedelta(minutes=int(app.config.get('ORDER_ESCALATION_MINUTES', 60)))
+        self.archive_after = timedelta(days=int(app.config.get('ORDER_ARCHIVE_AFTER_DAYS', 90)))
+        self.interval = int(app.config.get('SWEEP_INTERVAL_SECONDS', self.interval))
+        self.batch_size = int(app.config.get('SWEEP_BATCH_SIZE', self.batch_size))
+        self.lease_seconds = int(app.config.get('SWEEP_LEASE_SECONDS', self.interval * 3))
+        self._acknowledged = TTLCache(10000, self.escalate_after.total_seconds())
+        app.extensions['order_sweeper'] = self
+
+    # Leadership
+
+    def acquire_lease(self):
+        """Take or renew the sweeper lease; returns True if this worker holds it"""
+        now = time.time()
+        table = SchedulerLease.__table__
+        try:
+            renewed = db.session.execute(
+                update(table)
+                .where(table.c.name == LEASE_NAME, (table.c.holder == self.holder) | (table.c.expires_at < now))
+                .values(holder=self.holder, expires_at=now + self.lease_seconds)
+            ).rowcount
+            if not renewed:
+                db.session.execute(insert(table).values(name=LEASE_NAME, holder=self.holder,
+                                                        expires_at=now + self.lease_seconds))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            # Another worker holds an unexpired lease
+            db.session.rollback()
+            return False
+
+    # Passes
+
+    def expire_pending(self, on_status_change, now=None):
+        """Cancel pending orders older than ORDER_TIMEOUT_MINUTES; returns how many"""
+        cutoff = (now or datetime.utcnow()) - self.timeout
+        table = Order.__table__
+        returning = db.session.get_bind().dialect.update_returning
+        expired = 0
+        while True:
+            ids = [row[0] for row in db.session.query(Order.id)
+                   .filter(Order.status == 'pending', Order.timestamp < cutoff)
+                   .order_by(Order.timestamp).limit(self.batch_size).all()]
+            if not ids:
+                return expired
+            # Compare-and-set: an order accepted or cancelled by its customer
+            # meanwhile is left alone, and only rows this pass changed are reported
+            if returning:
+                changed = [row[0] for row in db.session.execute(
+                    update(table).where(table.c.id.in_(ids), table.c.status == 'pending')
+                    .values(status='cancelled').returning(table.c.id))]
+            else:
+                changed = [order_id for order_id in ids if db.session.execute(
+                    update(table).where(table.c.id == order_id, table.c.status == 'pending')
+                    .values(status='cancelled')).rowcount]
+            orders = Order.query.filter(Order.id.in_(changed)).all() if changed else []
+            for order in orders:
+                rollups.record_transition(order, 'cancelled')
+            db.session.commit()
+            for order in orders:
+                on_status_change(order, 'cancelled')
+                if subscriptions.has_subscribers(f'order_{order.id}'):
+                    socketio.emit('order_expired', {'order_id': order.id, 'reason': 'timeout'},
+                                  room=f'order_{order.id}')
+            expired += len(orders)
+            if len(ids) < self.batch_size:
+                return expired
+
+    def acknowledge_escalation(self, order_id):
+        """A restaurant dashboard showed the warning; stay quiet about it for ORDER_ESCALATION_MINUTES"""
+        self._acknowledged.set(order_id, True)
+
+    def escalate_stuck(self, now=None):
+        """Warn restaurants about orders stuck in progress, every pass until a dashboard acknowledges it"""
+        cutoff = (now or datetime.utcnow()) - self.escalate_after
+        rows = db.session.query(Order.id, Order.restaurant_id, Order.status, Order.timestamp) \
+            .filter(Order.status.in_(ESCALATE_STATUSES), Order.timestamp < cutoff) \
+            .order_by(Order.timestamp).limit(self.batch_size).all()
+        flagged = 0
+        for order_id, restaurant_id, status, placed_at in rows:
+            # Held back until someone has the restaurant dashboard open
+            if order_id in self._acknowledged or not subscriptions.has_subscribers(f'restaurant_{restaurant_id}'):
+                continue
+            socketio.emit('order_escalated', {
+                'order_id': order_id,
+                'status': status,
+                'waiting_minutes': int((datetime.utcnow() - placed_at).total_seconds() // 60)
+            }, room=f'restaurant_{restaurant_id}')
+            flagged += 1
+        return flagged
+
+    def archive_terminal(self, now=None):
+        """Move delivered/cancelled orders, their items and trails past the retention window to the archive tables"""
+        cutoff = (now or datetime.utcnow()) - self.archive_after
+        order_columns = _archive_columns(Order, OrderArchive)
+        item_columns = _archive_columns(OrderItem, OrderItemArchive)
+        sample_columns = _archive_columns(LocationSample, LocationSampleArchive)
+        archived = 0
+        while True:
+            ids = [row[0] for row in db.session.query(Order.id)
+                   .filter(Order.status.in_(ARCHIVE_STATUSES), Order.timestamp < cutoff)
+                   .order_by(Order.timestamp).limit(self.batch_size).all()]
+            if not ids:
+                return archived
+            try:
+                db.session.execute(
+                    insert(OrderArchive.__table__).from_select(
+                        [column.name for column in order_columns],
+                        select(*order_columns).where(Order.id.in_(ids))))
+                db.session.execute(
+                    insert(OrderItemArchive.__table__).from_select(
+                        [column.name for column in item_columns],
+                        select(*item_columns).where(OrderItem.order_id.in_(ids))))
+                db.session.execute(
+                    insert(LocationSampleArchive.__table__).from_select(
+                        [column.name for column in sample_columns],
+                        select(*sample_columns).where(LocationSample.order_id.in_(ids))))
+                db.session.execute(delete(LocationSample).where(LocationSample.order_id.in_(ids)))
+                db.session.execute(delete(OrderItem).where(OrderItem.order_id.in_(ids)))
+                db.session.execute(delete(Order).where(Order.id.in_(ids)))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            archived += len(ids)
+            if len(ids) < self.batch_size:
+                return archived
+
+    def sweep(self, on_status_change):
+        return {
+            'expired': self.expire_pending(on_status_change),
+            'escalated': self.escalate_stuck(),
+            'archived': self.archive_terminal()
+        }
+
+    def run(self, app, on_status_change):
+        """Background loop; on_status_change(order, status) publishes each expiry like a manual change"""
+        while True:
+            socketio.sleep(self.interval)
+            with app.app_context():
+                try:
+                    if self.acquire_lease():
+                        self.sweep(on_status_change)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Order sweep failed')
+                finally:
+                    db.session.remove()
+
+
+order_sweeper = OrderSweeper()
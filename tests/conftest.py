@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions import db  # noqa: E402
+from models.user import User  # noqa: E402
+from models.restaurant import Restaurant  # noqa: E402
+from models.menu_item import MenuItem  # noqa: E402
+from models.order import Order  # noqa: E402
+from models.order_item import OrderItem  # noqa: E402
+from models.order_rollup import OrderRollup  # noqa: E402
+from models.menu_item_rollup import MenuItemRollup  # noqa: E402
+from models.scheduler_lease import SchedulerLease  # noqa: E402
+
+# Tables the code under test reads or writes; status changes also update the rollups
+MODELS = [User, Restaurant, MenuItem, Order, OrderItem, OrderRollup, MenuItemRollup, SchedulerLease]
+
+
+@pytest.fixture
+def app(tmp_path):
+    # A file rather than :memory: so a second connection can play the competing writer
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "test.db"}')
+    db.init_app(app)
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=[model.__table__ for model in MODELS])
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(role, latitude=12.97, longitude=77.59):
+        user = User(name=f'{role} user', email=f'{role}-{User.query.count()}@example.com', password='x',
+                    role=role, latitude=latitude, longitude=longitude)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make_user
+
+
+@pytest.fixture
+def owner(make_user):
+    return make_user('restaurant')
+
+
+@pytest.fixture
+def restaurant(owner):
+    restaurant = Restaurant(owner_id=owner.id, name='Burger Palace', address='',
+                            cuisine_type='', latitude=12.97, longitude=77.59)
+    db.session.add(restaurant)
+    db.session.commit()
+    return restaurant
+
+
+@pytest.fixture
+def make_order(make_user, restaurant):
+    def make_order(status='pending', customer=None, agent=None):
+        order = Order(customer_id=(customer or make_user('customer')).id, restaurant_id=restaurant.id,
+                      agent_id=agent.id if agent else None, status=status, total_amount=100,
+                      delivery_address='123 MG Road')
+        db.session.add(order)
+        db.session.commit()
+        return order
+    return make_order
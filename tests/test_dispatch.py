@@ -0,0 +1,95 @@
+import pytest
+
+from extensions import db, socketio
+from dispatch import Dispatcher
+from order_events import order_feed
+
+
+@pytest.fixture
+def offers(monkeypatch):
+    """Agent ids each new_delivery_assignment went to, in order"""
+    sent = []
+    monkeypatch.setattr(order_feed, 'publish',
+                        lambda event, delta, rooms, **extra: sent.extend(int(room.split('_')[1]) for room in rooms))
+    return sent
+
+
+@pytest.fixture
+def dispatcher(app):
+    dispatcher = Dispatcher(app)
+    dispatcher.max_offers = 1
+    # Offers lapse at once, so every redispatch_expired call sees them expired
+    dispatcher.offer_ttl = 0
+    return dispatcher
+
+
+def _available(dispatcher, agent, longitude):
+    dispatcher.set_agent_available(agent.id, True, 12.97, longitude)
+
+
+def test_lapsed_offer_goes_to_the_next_best_agent(dispatcher, offers, make_user, make_order, restaurant):
+    nearest, next_best = make_user('delivery_agent'), make_user('delivery_agent')
+    _available(dispatcher, nearest, restaurant.longitude + 0.001)
+    _available(dispatcher, next_best, restaurant.longitude + 0.01)
+    order = make_order('ready_for_pickup')
+
+    assert dispatcher.offer(order) == [nearest.id]
+    assert dispatcher.redispatch_expired() == 1
+    assert offers == [nearest.id, next_best.id]
+
+
+def test_order_with_no_agent_nearby_is_offered_once_one_appears(dispatcher, offers, make_user, make_order,
+                                                                restaurant):
+    order = make_order('ready_for_pickup')
+    assert dispatcher.offer(order) == []
+
+    agent = make_user('delivery_agent')
+    _available(dispatcher, agent, restaurant.longitude)
+
+    assert dispatcher.redispatch_expired() == 1
+    assert offers == [agent.id]
+
+
+def test_order_every_agent_passed_on_is_offered_again(dispatcher, offers, make_user, make_order, restaurant):
+    agent = make_user('delivery_agent')
+    _available(dispatcher, agent, restaurant.longitude)
+    order = make_order('ready_for_pickup')
+    dispatcher.offer(order)
+
+    # The only agent nearby was already asked, so this round finds nobody...
+    dispatcher.redispatch_expired()
+    # ...and the next one starts over with the same agent
+    dispatcher.redispatch_expired()
+
+    assert offers == [agent.id, agent.id]
+
+
+@pytest.mark.parametrize('status', ['picked_up', 'cancelled'])
+def test_offers_for_orders_no_longer_ready_are_withdrawn(dispatcher, offers, make_user, make_order, restaurant,
+                                                        status):
+    agent = make_user('delivery_agent')
+    _available(dispatcher, agent, restaurant.longitude)
+    order = make_order('ready_for_pickup')
+    dispatcher.offer(order)
+    order.status = status
+    db.session.commit()
+
+    assert dispatcher.redispatch_expired() == 0
+    assert dispatcher.withdraw(order.id) == set()
+    assert offers == [agent.id]
+
+
+def test_run_survives_a_failed_pass(app, dispatcher, monkeypatch):
+    calls = []
+
+    def redispatch_expired():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('database went away')
+        raise SystemExit
+    monkeypatch.setattr(dispatcher, 'redispatch_expired', redispatch_expired)
+    monkeypatch.setattr(socketio, 'sleep', lambda seconds: None)
+
+    with pytest.raises(SystemExit):
+        dispatcher.run(app)
+    assert len(calls) == 2
@@ -0,0 +1,26 @@
+import time
+
+import pytest
+
+from location_pipeline import LocationCoalescer, parse_timestamp
+
+
+@pytest.mark.parametrize('value', [float('nan'), float('inf'), float('-inf'), True, False, 10 ** 400, 'yesterday'])
+def test_unusable_timestamps_are_rejected(value):
+    assert parse_timestamp(value, default=1.0) is None
+
+
+def test_timestamp_units_and_formats():
+    assert parse_timestamp(None, default=5.0) == 5.0
+    assert parse_timestamp(1700000000, default=None) == 1700000000.0
+    assert parse_timestamp(1700000000000, default=None) == 1700000000.0
+    assert parse_timestamp('2023-11-14T22:13:20Z', default=None) == 1700000000.0
+    assert parse_timestamp('2023-11-14T23:13:20+01:00', default=None) == 1700000000.0
+
+
+def test_nan_ping_is_dropped_before_it_reaches_flush():
+    coalescer = LocationCoalescer()
+
+    assert not coalescer.submit(1, 12.97, 77.59, timestamp=float('nan'), agent_id=2)
+    assert coalescer.submit(1, 12.97, 77.59, timestamp=time.time(), agent_id=2)
+    assert coalescer.dropped == 1
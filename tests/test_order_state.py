@@ -0,0 +1,135 @@
+import pytest
+
+from extensions import db
+from models.order import Order
+import order_state
+from order_state import ROLE_TARGETS, TRANSITIONS, TransitionError, transition
+
+
+def _commit_elsewhere(statement, **params):
+    # Commits on its own connection, like another worker's request would
+    with db.engine.begin() as connection:
+        connection.execute(db.text(statement), params)
+
+
+def _race(monkeypatch, statement, **params):
+    """Let a competing write land after transition() has read the order but before its UPDATE"""
+    authorize = order_state._authorize
+
+    def authorize_then_lose_race(order, new_status, user):
+        authorize(order, new_status, user)
+        _commit_elsewhere(statement, **params)
+    monkeypatch.setattr(order_state, '_authorize', authorize_then_lose_race)
+
+
+def test_agent_claims_ready_order(make_user, make_order):
+    agent = make_user('delivery_agent')
+    order = make_order('ready_for_pickup')
+
+    claimed = transition(order.id, 'picked_up', agent)
+
+    assert claimed.status == 'picked_up'
+    assert claimed.agent_id == agent.id
+
+
+def test_concurrent_claim_loses_compare_and_set(monkeypatch, make_user, make_order):
+    agent, rival = make_user('delivery_agent'), make_user('delivery_agent')
+    order = make_order('ready_for_pickup')
+    _race(monkeypatch, "UPDATE \"order\" SET status = 'picked_up', agent_id = :agent WHERE id = :id",
+          agent=rival.id, id=order.id)
+
+    with pytest.raises(TransitionError) as error:
+        transition(order.id, 'picked_up', agent)
+
+    assert error.value.status_code == 409
+    assert str(error.value) == 'Order was updated by someone else'
+    db.session.expire_all()
+    assert db.session.get(Order, order.id).agent_id == rival.id
+
+
+def test_status_changed_meanwhile_is_not_overwritten(monkeypatch, make_order, owner):
+    order = make_order('accepted')
+    _race(monkeypatch, "UPDATE \"order\" SET status = 'cancelled' WHERE id = :id", id=order.id)
+
+    with pytest.raises(TransitionError) as error:
+        transition(order.id, 'preparing', owner)
+
+    assert error.value.status_code == 409
+    assert str(error.value) == 'Order was updated by someone else'
+    db.session.expire_all()
+    assert db.session.get(Order, order.id).status == 'cancelled'
+
+
+def test_claimed_order_is_refused_to_another_agent(make_user, make_order):
+    agent, rival = make_user('delivery_agent'), make_user('delivery_agent')
+    order = make_order('picked_up', agent=agent)
+
+    with pytest.raises(TransitionError) as error:
+        transition(order.id, 'in_transit', rival)
+
+    assert error.value.status_code == 409
+
+
+@pytest.mark.parametrize('role', sorted(ROLE_TARGETS))
+@pytest.mark.parametrize('new_status', sorted(set(s for targets in TRANSITIONS.values() for s in targets)))
+def test_role_targets_are_enforced(make_user, make_order, owner, role, new_status):
+    source = next(status for status, targets in TRANSITIONS.items() if new_status in targets)
+    customer = make_user('customer')
+    user = {'restaurant': owner, 'customer': customer}.get(role) or make_user(role)
+    agent = user if role == 'delivery_agent' and source in ('picked_up', 'in_transit') else None
+    order = make_order(source, customer=customer, agent=agent)
+
+    if new_status in ROLE_TARGETS[role]:
+        assert transition(order.id, new_status, user).status == new_status
+    else:
+        with pytest.raises(TransitionError) as error:
+            transition(order.id, new_status, user)
+        assert error.value.status_code == 403
+        db.session.expire_all()
+        assert db.session.get(Order, order.id).status == source
+
+
+def test_customer_cannot_cancel_someone_elses_order(make_user, make_order):
+    order = make_order('pending')
+
+    with pytest.raises(TransitionError) as error:
+        transition(order.id, 'cancelled', make_user('customer'))
+
+    assert error.value.status_code == 403
+
+
+def test_other_restaurant_owner_is_refused(make_user, make_order):
+    order = make_order('pending')
+
+    with pytest.raises(TransitionError) as error:
+        transition(order.id, 'accepted', make_user('restaurant'))
+
+    assert error.value.status_code == 403
+
+
+def test_agent_cannot_deliver_an_unclaimed_order(make_user, make_order):
+    order = make_order('ready_for_pickup')
+
+    with pytest.raises(TransitionError) as error:
+        transition(order.id, 'delivered', make_user('delivery_agent'))
+
+    assert error.value.status_code == 403
+
+
+@pytest.mark.parametrize('source, new_status', [('delivered', 'cancelled'), ('pending', 'preparing')])
+def test_transition_outside_the_state_machine_conflicts(make_order, owner, source, new_status):
+    order = make_order(source)
+
+    with pytest.raises(TransitionError) as error:
+        transition(order.id, new_status, owner)
+
+    assert error.value.status_code == 409
+
+
+def test_unknown_status_is_rejected(make_user, make_order):
+    order = make_order('pending')
+
+    with pytest.raises(TransitionError) as error:
+        transition(order.id, 'confirmed', make_user('customer'))
+
+    assert error.value.status_code == 400
@@ -0,0 +1,79 @@
+import types
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db, socketio
+import sweeper
+from sweeper import OrderSweeper
+from subscriptions import subscriptions
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sweeper, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def workers(app):
+    first, second = OrderSweeper(app), OrderSweeper(app)
+    first.lease_seconds = second.lease_seconds = 60
+    return first, second
+
+
+def test_first_worker_takes_the_lease(workers, clock):
+    first, second = workers
+
+    assert first.acquire_lease()
+    assert not second.acquire_lease()
+
+
+def test_holder_renews_its_lease(workers, clock):
+    first, second = workers
+    first.acquire_lease()
+
+    clock[0] += 50
+    assert first.acquire_lease()
+    # Renewed at t+50, so the lease still holds at t+100
+    clock[0] += 50
+    assert not second.acquire_lease()
+
+
+def test_expired_lease_passes_to_another_worker(workers, clock):
+    first, second = workers
+    first.acquire_lease()
+
+    clock[0] += 61
+    assert second.acquire_lease()
+    assert not first.acquire_lease()
+
+
+def test_refused_lease_leaves_the_session_usable(workers, clock):
+    first, second = workers
+    first.acquire_lease()
+    second.acquire_lease()
+
+    assert db.session.execute(db.text('SELECT holder FROM scheduler_lease')).scalar() == first.holder
+
+
+@pytest.fixture
+def escalations(monkeypatch):
+    sent = []
+    monkeypatch.setattr(subscriptions, 'skip_empty', False)
+    monkeypatch.setattr(socketio, 'emit', lambda event, data, room: sent.append((event, data['order_id'], room)))
+    return sent
+
+
+def test_escalation_is_resent_until_acknowledged(app, escalations, make_order, restaurant):
+    sweeper = OrderSweeper(app)
+    order = make_order('preparing')
+    order.timestamp = datetime.utcnow() - timedelta(hours=2)
+    db.session.commit()
+
+    assert sweeper.escalate_stuck() == 1
+    assert sweeper.escalate_stuck() == 1
+    sweeper.acknowledge_escalation(order.id)
+    assert sweeper.escalate_stuck() == 0
+    assert escalations == [('order_escalated', order.id, f'restaurant_{restaurant.id}')] * 2
@@ -0,0 +1,77 @@
+import json
+import threading
+import uuid
+
+from extensions import db, socketio
+
+
+class WorkerBus:
+    """Runs cache invalidations on every worker, not just the one that made the write.
+
+    publish(topic, *args) calls the topic's handlers in this process at once
+    and, when SOCKETIO_MESSAGE_QUEUE is a redis:// URL, broadcasts the call
+    on a Redis channel that every other worker's run() loop replays. With no
+    queue (a single worker) or local:// there is nobody else to tell. Other
+    queue types (amqp://, kafka://) are not supported here, so other workers
+    only catch up when their cache entries expire.
+    """
+
+    def __init__(self, app=None):
+        self.origin = uuid.uuid4().hex
+        self.channel = 'swiftserve-invalidate'
+        self._handlers = {}
+        self._redis = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        url = app.config.get('SOCKETIO_MESSAGE_QUEUE') or ''
+        self.channel = app.config.get('SOCKETIO_CHANNEL', 'swiftserve') + '-invalidate'
+        if url.startswith(('redis://', 'rediss://')):
+            import redis
+            self._redis = redis.Redis.from_url(url)
+        app.extensions['worker_bus'] = self
+
+    @property
+    def shared(self):
+        return self._redis is not None
+
+    def subscribe(self, topic, handler):
+        with self._lock:
+            self._handlers.setdefault(topic, []).append(handler)
+
+    def _dispatch(self, topic, args):
+        for handler in self._handlers.get(topic, ()):
+            handler(*args)
+
+    def publish(self, topic, *args):
+        self._dispatch(topic, args)
+        if self._redis is not None:
+            self._redis.publish(self.channel, json.dumps({'origin': self.origin, 'topic': topic, 'args': args}))
+
+    def run(self, app):
+        """Replay other workers' invalidations; start with socketio.start_background_task"""
+        if self._redis is None:
+            return
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    event = json.loads(message['data'])
+                    if event['origin'] == self.origin:
+                        continue
+                    with app.app_context():
+                        try:
+                            self._dispatch(event['topic'], event['args'])
+                        finally:
+                            db.session.remove()
+            except Exception:
+                app.logger.exception('Invalidation listener failed; resubscribing')
+                socketio.sleep(1)
+            finally:
+                pubsub.close()
+
+
+worker_bus = WorkerBus()
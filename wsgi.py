@@ -0,0 +1,19 @@
+import os
+
+import eventlet
+eventlet.monkey_patch()
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv()
+if (os.getenv('DATABASE_URL') or '').startswith(('postgres://', 'postgresql')):
+    # psycopg2 blocks the hub unless it is told to yield to eventlet
+    from psycogreen.eventlet import patch_psycopg
+    patch_psycopg()
+
+from app import app, start_background_tasks  # noqa: E402
+
+# gunicorn serves wsgi:app
+__all__ = ['app']
+
+start_background_tasks()